@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping
+
+import anyio.to_thread
+
+# Per thread_id / per client: sustained 30 requests per minute, bursts of 10
+KEY_RATE_PER_SECOND = 0.5
+KEY_BURST = 10
+# Whole deployment: protects the shared provider quota
+GLOBAL_RATE_PER_SECOND = 20.0
+GLOBAL_BURST = 40
+MAX_IN_FLIGHT = 16  # concurrent requests talking to the LLM provider
+MAX_QUEUE = 32  # requests allowed to wait for an in-flight slot
+# In-flight slots /chat/batch items may hold together; the rest stay free for interactive /chat
+MAX_BATCH_IN_FLIGHT = 8
+QUEUE_TIMEOUT = 10.0  # seconds a queued request waits before being rejected
+MAX_TRACKED_KEYS = 10000  # least recently seen keys are forgotten beyond this
+# /chat is a sync endpoint, so admitted and queued requests each hold one of anyio's worker
+# threads while they wait. The pool is sized to fit all of them plus this many threads for
+# everything else, otherwise excess requests queue invisibly in anyio instead of being rejected
+THREADPOOL_HEADROOM = 24
+# Where the per-client key comes from: the socket peer, the X-Forwarded-For entry added by
+# our own proxies, or a header with an authenticated client id ("header:X-Client-Id")
+CLIENT_KEY_SOURCES = ("peer", "forwarded", "header:")
+
+
+class AdmissionRejected(Exception):
+    """Request rejected by admission control; the caller should answer 429 with Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        # A bucket created after `now` was taken must not go below capacity
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class AdmissionController:
+    """Token buckets per key and global, plus a bounded queue in front of upstream calls"""
+
+    def __init__(
+        self,
+        key_rate: float = KEY_RATE_PER_SECOND,
+        key_burst: int = KEY_BURST,
+        global_rate: float = GLOBAL_RATE_PER_SECOND,
+        global_burst: int = GLOBAL_BURST,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_queue: int = MAX_QUEUE,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        max_batch_in_flight: int = MAX_BATCH_IN_FLIGHT,
+        client_key_source: str = "peer",
+        trusted_proxies: int = 1,
+    ) -> None:
+        if not client_key_source.startswith(CLIENT_KEY_SOURCES) or client_key_source == "header:":
+            raise ValueError(f"Unknown client key source: {client_key_source} (expected one of {CLIENT_KEY_SOURCES})")
+        self.client_key_source = client_key_source
+        self.trusted_proxies = trusted_proxies
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_batch_in_flight = min(max_batch_in_flight, max_in_flight)
+
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self.in_flight = 0
+        self.batch_in_flight = 0
+        self.waiting = 0
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "rejected_key_rate": 0,
+            "rejected_global_rate": 0,
+            "rejected_queue_full": 0,
+            "rejected_queue_timeout": 0,
+            "rejected_batch_timeout": 0,
+        }
+        self.peak_in_flight = 0
+        self.peak_waiting = 0
+
+    def client_key(self, peer: str, headers: Mapping[str, str]) -> str:
+        """Identity for the per-client bucket; falls back to the socket peer when the header is missing.
+
+        Behind a proxy every request comes from the proxy's address, so all users would share one
+        bucket. With "forwarded", X-Forwarded-For is read from the right: the entry added by the
+        outermost of trusted_proxies proxies is the client, anything left of it is client-supplied."""
+        if self.client_key_source == "forwarded":
+            hops = [h.strip() for h in headers.get("x-forwarded-for", "").split(",") if h.strip()]
+            if len(hops) >= self.trusted_proxies:
+                return hops[-self.trusted_proxies]
+        elif self.client_key_source.startswith("header:"):
+            value = headers.get(self.client_key_source[len("header:"):])
+            if value:
+                return value
+        return peer
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.key_rate, self.key_burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > MAX_TRACKED_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, keys: List[str]) -> None:
+        """Takes one token from every key bucket and the global bucket, or none of them"""
+        with self._lock:
+            now = time.monotonic()
+            buckets = [self._bucket(k) for k in keys if k]
+            key_wait = max((b.wait_time(now) for b in buckets), default=0.0)
+            if key_wait > 0:
+                self.counters["rejected_key_rate"] += 1
+                raise AdmissionRejected("Rate limit exceeded for this thread or client", key_wait)
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                self.counters["rejected_global_rate"] += 1
+                raise AdmissionRejected("Service is at capacity", global_wait)
+            for b in buckets:
+                b.take()
+            self.global_bucket.take()
+            self.counters["admitted"] += 1
+
+    @contextmanager
+    def upstream_slot(self, batch: bool = False) -> Iterator[None]:
+        """Holds one of MAX_IN_FLIGHT slots; waits in a bounded queue, rejects fast when it's full.
+
+        batch: a /chat/batch item, limited to max_batch_in_flight slots and only admitted
+        while no interactive request is queued, so a large batch can't starve /chat"""
+        if batch:
+            self._acquire_batch_slot()
+        else:
+            self._acquire_slot()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if batch:
+                    self.batch_in_flight -= 1
+                # Interactive and batch waiters wait for different conditions
+                self._slot_freed.notify_all()
+
+    def _acquire_slot(self) -> None:
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_queue:
+                    self.counters["rejected_queue_full"] += 1
+                    raise AdmissionRejected("Too many requests in progress", self._retry_after_estimate())
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters["rejected_queue_timeout"] += 1
+                            raise AdmissionRejected("Timed out waiting for capacity", self._retry_after_estimate())
+                        self._slot_freed.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _acquire_batch_slot(self) -> None:
+        # Batch items don't take places in the interactive queue: each batch already bounds
+        # how many of its items wait at once (its concurrency)
+        with self._lock:
+            deadline = time.monotonic() + self.queue_timeout
+            while (
+                self.in_flight >= self.max_in_flight
+                or self.batch_in_flight >= self.max_batch_in_flight
+                or self.waiting
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["rejected_batch_timeout"] += 1
+                    raise AdmissionRejected("Timed out waiting for batch capacity", self._retry_after_estimate())
+                self._slot_freed.wait(remaining)
+            self.in_flight += 1
+            self.batch_in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _retry_after_estimate(self) -> float:
+        # Rough: the queue drains in about queue_timeout when every slot is busy
+        return max(1.0, self.queue_timeout * (self.waiting + 1) / max(self.max_queue, 1))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and saturation levels (0..1) for dashboards"""
+        with self._lock:
+            now = time.monotonic()
+            self.global_bucket.wait_time(now)  # refresh tokens
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "batch_in_flight": self.batch_in_flight,
+                "max_batch_in_flight": self.max_batch_in_flight,
+                "waiting": self.waiting,
+                "max_queue": self.max_queue,
+                "peak_in_flight": self.peak_in_flight,
+                "peak_waiting": self.peak_waiting,
+                "saturation": {
+                    "in_flight": self.in_flight / self.max_in_flight,
+                    "queue": self.waiting / self.max_queue if self.max_queue else 1.0,
+                    "global_rate": 1 - self.global_bucket.tokens / self.global_bucket.capacity,
+                },
+                "tracked_keys": len(self._buckets),
+                "counters": dict(self.counters),
+            }
+
+
+def size_threadpool(controller: AdmissionController, headroom: int = THREADPOOL_HEADROOM) -> int:
+    """Sets anyio's worker-thread limit to in-flight slots + queue + headroom (call from the event loop)"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = controller.max_in_flight + controller.max_queue + headroom
+    return limiter.total_tokens
+
+
+def admission_keys(thread_id: str, client: str) -> List[str]:
+    return [f"thread:{thread_id}", f"client:{client}"]
+
+
+def rejection_headers(e: AdmissionRejected) -> Dict[str, str]:
+    # Retry-After is whole seconds; round up so clients never retry too early
+    return {"Retry-After": str(max(1, int(e.retry_after + 0.999)))}
+
@@ -0,0 +1,197 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Upper bounds of the latency histogram, ms (last bucket is everything slower)
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
+# Dimensions counted per hour; "all" has a single value and holds the totals
+DIMENSIONS = ("all", "tenant", "top_kb", "confidence", "ticket_priority", "tool_iterations", "outcome", "latency_ms")
+
+
+def hour_bucket(ts: float) -> int:
+    return int(ts // 3600) * 3600
+
+
+def latency_bucket(latency_ms: float) -> str:
+    for upper in LATENCY_BUCKETS_MS:
+        if latency_ms <= upper:
+            return str(upper)
+    return "inf"
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class AnalyticsStore:
+    """Hourly rollups of /chat outcomes, updated on every chat so dashboards never scan runs"""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init(self) -> None:
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS analytics_hourly (
+              hour INTEGER NOT NULL,
+              dimension TEXT NOT NULL,
+              value TEXT NOT NULL,
+              chats INTEGER NOT NULL DEFAULT 0,
+              tickets INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY (hour, dimension, value)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_latency_hourly (
+              hour INTEGER PRIMARY KEY,
+              chats INTEGER NOT NULL DEFAULT 0,
+              total_ms REAL NOT NULL DEFAULT 0,
+              min_ms REAL,
+              max_ms REAL
+            );
+            """
+        )
+        conn.commit()
+        conn.close()
+
+    def record(
+        self,
+        tenant_id: str,
+        top_kb: Optional[str],
+        confidence: str,
+        ticket_priority: Optional[str],
+        tool_iterations: int,
+        outcome: str,
+        latency_ms: float,
+        ts: Optional[float] = None,
+    ) -> None:
+        """Adds one chat to its hour's rollup rows (one transaction)"""
+        hour = hour_bucket(ts if ts is not None else time.time())
+        ticket = 1 if ticket_priority else 0
+        values = {
+            "all": "",
+            "tenant": tenant_id,
+            "top_kb": top_kb or "(none)",
+            "confidence": confidence,
+            "ticket_priority": ticket_priority or "(none)",
+            "tool_iterations": str(tool_iterations),
+            "outcome": outcome,
+            "latency_ms": latency_bucket(latency_ms),
+        }
+        conn = self._connect()
+        try:
+            conn.executemany(
+                """
+                INSERT INTO analytics_hourly (hour, dimension, value, chats, tickets) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (hour, dimension, value) DO UPDATE SET
+                  chats = chats + 1,
+                  tickets = tickets + excluded.tickets
+                """,
+                [(hour, dimension, value, ticket) for dimension, value in values.items()],
+            )
+            conn.execute(
+                """
+                INSERT INTO analytics_latency_hourly (hour, chats, total_ms, min_ms, max_ms) VALUES (?, 1, ?, ?, ?)
+                ON CONFLICT (hour) DO UPDATE SET
+                  chats = chats + 1,
+                  total_ms = total_ms + excluded.total_ms,
+                  min_ms = MIN(min_ms, excluded.min_ms),
+                  max_ms = MAX(max_ms, excluded.max_ms)
+                """,
+                (hour, latency_ms, latency_ms, latency_ms),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def summary(self, since: float, until: float) -> Dict[str, Any]:
+        """Totals, per-dimension breakdowns, hourly series and latency summary for [since, until)"""
+        start, end = hour_bucket(since), hour_bucket(until) + 3600
+        conn = self._connect()
+        rows = conn.execute(
+            """
+            SELECT hour, dimension, value, chats, tickets FROM analytics_hourly
+            WHERE hour >= ? AND hour < ? ORDER BY hour
+            """,
+            (start, end),
+        ).fetchall()
+        latency = conn.execute(
+            """
+            SELECT SUM(chats) AS chats, SUM(total_ms) AS total_ms, MIN(min_ms) AS min_ms, MAX(max_ms) AS max_ms
+            FROM analytics_latency_hourly WHERE hour >= ? AND hour < ?
+            """,
+            (start, end),
+        ).fetchone()
+        conn.close()
+
+        totals: Dict[str, Dict[str, List[int]]] = {d: {} for d in DIMENSIONS}
+        hourly: List[Dict[str, Any]] = []
+        for row in rows:
+            counts = totals.setdefault(row["dimension"], {}).setdefault(row["value"], [0, 0])
+            counts[0] += row["chats"]
+            counts[1] += row["tickets"]
+            if row["dimension"] == "all":
+                hourly.append({"hour": _iso(row["hour"]), "chats": row["chats"], "tickets": row["tickets"]})
+
+        chats, tickets = totals["all"].get("", [0, 0])
+        report: Dict[str, Any] = {
+            "from": _iso(start),
+            "to": _iso(end),
+            "chats": chats,
+            "tickets": tickets,
+            "ticket_rate": round(tickets / chats, 4) if chats else None,
+        }
+        for dimension in ("tenant", "top_kb", "confidence", "ticket_priority", "tool_iterations", "outcome"):
+            report[dimension] = self._breakdown(totals[dimension], chats)
+        report["latency_ms"] = self._latency(latency, totals["latency_ms"])
+        report["hourly"] = hourly
+        return report
+
+    @staticmethod
+    def _breakdown(values: Dict[str, List[int]], chats: int) -> List[Dict[str, Any]]:
+        out = []
+        for value, (n, tickets) in sorted(values.items(), key=lambda x: -x[1][0]):
+            out.append(
+                {
+                    "value": value,
+                    "chats": n,
+                    "share": round(n / chats, 4) if chats else None,
+                    "tickets": tickets,
+                    "ticket_rate": round(tickets / n, 4) if n else None,
+                }
+            )
+        return out
+
+    @staticmethod
+    def _latency(row: Optional[sqlite3.Row], buckets: Dict[str, List[int]]) -> Dict[str, Any]:
+        if row is None or not row["chats"]:
+            return {"chats": 0}
+        histogram: List[Tuple[str, int]] = [
+            (label, buckets[label][0])
+            for label in [str(u) for u in LATENCY_BUCKETS_MS] + ["inf"]
+            if label in buckets
+        ]
+
+        def percentile(p: float) -> Optional[str]:
+            # Upper bound of the bucket holding the p-th chat, e.g. "≤2000"
+            target, seen = p * row["chats"], 0
+            for label, n in histogram:
+                seen += n
+                if seen >= target:
+                    return f"≤{label}" if label != "inf" else f">{LATENCY_BUCKETS_MS[-1]}"
+            return None
+
+        return {
+            "chats": row["chats"],
+            "avg": round(row["total_ms"] / row["chats"], 1),
+            "min": round(row["min_ms"], 1),
+            "max": round(row["max_ms"], 1),
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "histogram": dict(histogram),
+        }
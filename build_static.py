@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Builds static/ into static_build/ for production serving.
+
+- fingerprints assets: style.css → style.<hash>.css (served with immutable caching)
+- rewrites /static/... references in HTML, CSS and JS to the fingerprinted names
+- precompresses text assets with gzip, and brotli if the `brotli` package is installed
+- writes manifest.json, which main.py uses to pick files, encodings and cache headers
+
+Usage:
+    python build_static.py [--source static] [--output static_build]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import time
+from typing import Dict, List
+from urllib.parse import unquote
+
+from static_assets import MANIFEST_NAME, STATIC_BUILD_DIR, STATIC_SOURCE_DIR
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml"}
+# References inside one kind of file can only point at kinds processed before it
+BUILD_ORDER = ["other", ".css", ".js", ".html"]
+# Fingerprinting index.html would break "/", it's served with ETag revalidation instead
+UNHASHED_NAMES = {"index.html"}
+REFERENCE_RE = re.compile(r"/static/([^\"'()\s?#]+)(\?[^\"'()\s#]*)?")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def fingerprinted_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def rewrite_references(text: str, served: Dict[str, str]) -> str:
+    """/static/<name>[?v=...] → /static/<fingerprinted name> for every asset built so far"""
+
+    def replace(match: "re.Match[str]") -> str:
+        name = unquote(match.group(1))
+        if name in served:
+            return f"/static/{served[name]}"
+        return match.group(0)
+
+    return REFERENCE_RE.sub(replace, text)
+
+
+def write_compressed(path: str, data: bytes) -> Dict[str, str]:
+    """Writes .gz (and .br) next to path when smaller than the original; returns encoding → file name"""
+    variants = {"gzip": (".gz", gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        variants["br"] = (".br", brotli.compress(data, quality=11))
+    written = {}
+    for encoding, (suffix, compressed) in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            written[encoding] = os.path.basename(path) + suffix
+    return written
+
+
+def build(source_dir: str, output_dir: str) -> Dict[str, object]:
+    names = sorted(n for n in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, n)))
+    groups: Dict[str, List[str]] = {kind: [] for kind in BUILD_ORDER}
+    for name in names:
+        ext = os.path.splitext(name)[1].lower()
+        groups[ext if ext in groups else "other"].append(name)
+
+    # Build next to the target and swap, so a half-written build is never served
+    tmp_dir = output_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    served: Dict[str, str] = {}  # source name → fingerprinted name
+    files: Dict[str, Dict[str, object]] = {}
+    for kind in BUILD_ORDER:
+        for name in groups[kind]:
+            with open(os.path.join(source_dir, name), "rb") as f:
+                data = f.read()
+            if kind != "other":
+                data = rewrite_references(data.decode("utf-8"), served).encode("utf-8")
+
+            digest = content_hash(data)
+            path = name if name in UNHASHED_NAMES else fingerprinted_name(name, digest)
+            with open(os.path.join(tmp_dir, path), "wb") as f:
+                f.write(data)
+            encodings: Dict[str, str] = {}
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                encodings = write_compressed(os.path.join(tmp_dir, path), data)
+            served[name] = path
+            files[name] = {
+                "source": name,
+                "path": path,
+                "hash": digest,
+                "size": len(data),
+                "content_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                "encodings": encodings,
+            }
+
+    manifest = {"version": 1, "built_at": time.time(), "brotli": brotli is not None, "files": files}
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument("--source", default=STATIC_SOURCE_DIR)
+    parser.add_argument("--output", default=STATIC_BUILD_DIR)
+    args = parser.parse_args()
+
+    manifest = build(args.source, args.output)
+    for name, entry in manifest["files"].items():
+        variants = ", ".join(f"{e} {os.path.getsize(os.path.join(args.output, p))}B" for e, p in entry["encodings"].items())
+        print(f"  {name} → {entry['path']} ({entry['size']}B{', ' + variants if variants else ''})")
+    if not manifest["brotli"]:
+        print("ℹ️  brotli not installed, gzip only (pip install brotli)")
+    print(f"✅ {len(manifest['files'])} files → {args.output}/")
+
+
+if __name__ == "__main__":
+    main()
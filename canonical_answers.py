@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Precomputed answers for canonical KB questions.
+
+Most questions are paraphrases of a few canonical ones per article. Their full
+structured responses are generated ahead of time (at startup with
+CANONICAL_WARMUP=1, or offline with this script) and stored in runs.db keyed by
+article and article version. /chat serves a stored answer when the question is a
+close match; an entry is regenerated only when its article changes.
+
+Usage:
+    python canonical_answers.py                 # default KB
+    python canonical_answers.py --tenant acme   # kbs/acme/kb.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from kb_index import get_kb_index, normalize_query
+from routing import route_kb_results
+
+CANONICAL_QUESTIONS_FILE = "canonical_questions.json"  # next to the KB file
+CANONICAL_MIN_SIMILARITY = 0.8  # Jaccard over normalized query words
+CANONICAL_REFRESH_SECONDS = 60.0  # how often a worker picks up entries written by others
+CANONICAL_THREAD_ID = "canonical-warmup"
+
+
+def article_version(article: Dict[str, str]) -> str:
+    """Content hash of the parts of an article that end up in the answer"""
+    blob = json.dumps([article.get("title"), article.get("content"), article.get("url")], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def question_words(text: str) -> Set[str]:
+    return set(normalize_query(text))
+
+
+def question_script(text: str) -> str:
+    """"cyrillic" or "latin" by the majority of letters ("" if none). Words are compared after
+    RU→EN translation, so this keeps a Russian stored answer from serving an English question"""
+    cyrillic = sum(1 for c in text if "\u0400" <= c <= "\u04ff")
+    latin = sum(1 for c in text if c.isascii() and c.isalpha())
+    if not cyrillic and not latin:
+        return ""
+    return "cyrillic" if cyrillic > latin else "latin"
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def canonical_questions_path(kb_path: str) -> str:
+    return os.path.join(os.path.dirname(kb_path), CANONICAL_QUESTIONS_FILE)
+
+
+def load_canonical_questions(kb_path: str) -> Dict[str, List[str]]:
+    """article_id → canonical questions; empty if the KB has no questions file"""
+    path = canonical_questions_path(kb_path)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class CanonicalAnswerStore:
+    """Stored responses per (KB, article, question), served while the article version matches"""
+
+    def __init__(self, db_path: str, min_similarity: float = CANONICAL_MIN_SIMILARITY) -> None:
+        self.db_path = db_path
+        self.min_similarity = min_similarity
+        # (kb_path, article_id) → [(question words, question script, article version, response)]
+        self._entries: Dict[Tuple[str, str], List[Tuple[Set[str], str, str, Dict[str, Any]]]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()  # one refresh at a time, see _refresh_if_stale()
+        self.hits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init(self) -> None:
+        self.create_schema()
+        self.reload()
+
+    def create_schema(self) -> None:
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS canonical_answers (
+              kb_path TEXT NOT NULL,
+              article_id TEXT NOT NULL,
+              question TEXT NOT NULL,
+              article_version TEXT NOT NULL,
+              response TEXT NOT NULL,
+              created_at REAL,
+              PRIMARY KEY (kb_path, article_id, question)
+            )
+            """
+        )
+        conn.commit()
+        conn.close()
+
+    def reload(self) -> None:
+        conn = self._connect()
+        rows = conn.execute("SELECT kb_path, article_id, question, article_version, response FROM canonical_answers")
+        entries: Dict[Tuple[str, str], List[Tuple[Set[str], str, str, Dict[str, Any]]]] = {}
+        for row in rows:
+            entries.setdefault((row["kb_path"], row["article_id"]), []).append(
+                (
+                    question_words(row["question"]),
+                    question_script(row["question"]),
+                    row["article_version"],
+                    json.loads(row["response"]),
+                )
+            )
+        conn.close()
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def _refresh_if_stale(self) -> None:
+        """Reloads in the first request to notice stale entries; requests arriving meanwhile
+        don't wait for it and keep using the current entries"""
+        if time.monotonic() - self._loaded_at <= CANONICAL_REFRESH_SECONDS:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            # Another request may have finished a reload between the check and the acquire
+            if time.monotonic() - self._loaded_at > CANONICAL_REFRESH_SECONDS:
+                self.reload()
+        finally:
+            self._reload_lock.release()
+
+    def lookup(self, kb_path: str, message: str, kb_results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Stored response for a close match of message on the top KB article, if still current
+        and asked in the same script (answers are written in the language of their question)"""
+        if not kb_results:
+            return None
+        self._refresh_if_stale()
+        article_id = kb_results[0]["id"]
+        with self._lock:
+            candidates = self._entries.get((kb_path, article_id))
+        if not candidates:
+            return None
+
+        current = article_version(get_kb_index(kb_path).article(article_id))
+        words = question_words(message)
+        script = question_script(message)
+        best: Optional[Tuple[float, Dict[str, Any]]] = None
+        for entry_words, entry_script, version, response in candidates:
+            if version != current:
+                continue  # article edited since: wait for regeneration rather than serve stale steps
+            if entry_script != script:
+                continue
+            score = similarity(words, entry_words)
+            if score >= self.min_similarity and (best is None or score > best[0]):
+                best = (score, response)
+        if best is None:
+            return None
+        self.hits += 1
+        return json.loads(json.dumps(best[1]))  # callers may modify the response
+
+    def _stored_versions(self, kb_path: str) -> Dict[Tuple[str, str], str]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT article_id, question, article_version FROM canonical_answers WHERE kb_path = ?", (kb_path,)
+        )
+        versions = {(row["article_id"], row["question"]): row["article_version"] for row in rows}
+        conn.close()
+        return versions
+
+    def warm_up(
+        self,
+        kb_path: str,
+        generate: Callable[[str, List[Dict[str, Any]]], Dict[str, Any]],
+    ) -> Dict[str, int]:
+        """Generates answers for canonical questions whose article is new or changed; drops removed ones"""
+        questions = load_canonical_questions(kb_path)
+        index = get_kb_index(kb_path)
+        stored = self._stored_versions(kb_path)
+        counts = {"generated": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+        wanted = set()
+
+        for article_id, article_questions in questions.items():
+            try:
+                version = article_version(index.article(article_id))
+            except KeyError:
+                print(f"⚠️  Canonical questions for unknown article {article_id} in {kb_path}")
+                continue
+            for question in article_questions:
+                wanted.add((article_id, question))
+                if stored.get((article_id, question)) == version:
+                    counts["unchanged"] += 1
+                    continue
+
+                kb_results = index.search(normalize_query(question), limit=5)
+                routed, _, can_create_ticket = route_kb_results(kb_results)
+                # Only questions that clearly retrieve their own article: those never reach ticket tools
+                if not routed or routed[0]["id"] != article_id or can_create_ticket:
+                    print(f"⚠️  Canonical question {question!r} doesn't retrieve {article_id}, skipped")
+                    counts["skipped"] += 1
+                    continue
+                response = generate(question, kb_results)
+                if response.get("error") or response.get("degraded"):
+                    counts["skipped"] += 1
+                    continue
+                self._put(kb_path, article_id, question, version, response)
+                counts["generated"] += 1
+
+        removed = [key for key in stored if key not in wanted]
+        if removed:
+            conn = self._connect()
+            conn.executemany(
+                "DELETE FROM canonical_answers WHERE kb_path = ? AND article_id = ? AND question = ?",
+                [(kb_path, article_id, question) for article_id, question in removed],
+            )
+            conn.commit()
+            conn.close()
+            counts["removed"] = len(removed)
+        self.reload()
+        return counts
+
+    def _put(self, kb_path: str, article_id: str, question: str, version: str, response: Dict[str, Any]) -> None:
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO canonical_answers
+              (kb_path, article_id, question, article_version, response, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (kb_path, article_id, question, version, json.dumps(response, ensure_ascii=False), time.time()),
+        )
+        conn.commit()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate stored answers for canonical KB questions")
+    parser.add_argument("--tenant", help="Tenant id (default KB if omitted)")
+    args = parser.parse_args()
+
+    # Imported here: main builds the app and the LLM client
+    from main import init_db, canonical_store, tenants, warm_up_canonical_answers
+
+    init_db()
+    canonical_store.reload()
+    tenant = tenants.get(args.tenant)
+    counts = warm_up_canonical_answers(tenant)
+    print(f"✅ {tenant.kb_path}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
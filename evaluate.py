@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Offline replay of retrieval and routing decisions over historical questions.
+
+Re-runs search_kb, threshold filtering, confidence and can_create_ticket for every
+question in runs.db (or a JSONL file) across a process pool and reports how routing
+changes between the current thresholds and candidate ones. No LLM calls are made:
+model answers come from a recorded-response stand-in (final_answer in runs.db, or
+--responses JSONL), so confidence rules that look at the answer can be replayed too.
+
+Usage:
+    python evaluate.py --db runs.db --raw-threshold 3.0 --normalizer 12
+    python evaluate.py --jsonl questions.jsonl --field message --responses answers.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from kb_index import get_kb_index, normalize_query
+from routing import (
+    KB_SCORE_NORMALIZER,
+    KB_SCORE_THRESHOLD,
+    KB_SCORE_THRESHOLD_RAW,
+    determine_confidence_from_score,
+    is_fast_path_eligible,
+    route_kb_results,
+)
+
+CHUNK_SIZE = 2000  # questions per task sent to a worker process
+
+_kb_path: Optional[str] = None
+
+
+# ---------- inputs ----------
+def load_questions_from_db(db_path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """One question per logged /chat call, with its recorded answer and whether a ticket was created"""
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(runs)")}
+    run_id_column = "run_id" if "run_id" in columns else "NULL"
+    rows = cur.execute(
+        f"SELECT {run_id_column}, thread_id, user_message, tool_name, final_answer FROM runs ORDER BY id"
+    )
+    # Rows of one chat call share run_id, so repeated identical chats stay separate questions
+    questions: Dict[Any, Dict[str, Any]] = {}
+    legacy_calls = 0
+    previous = None
+    for run_id, thread_id, user_message, tool_name, final_answer in rows:
+        content = (thread_id, user_message, final_answer)
+        if run_id is not None:
+            key: Any = run_id
+        else:
+            # Logged before run_id: a call's rows were written one after another, starting with
+            # search_kb, so a new call starts at search_kb or where the content changes
+            if tool_name == "search_kb" or content != previous:
+                legacy_calls += 1
+            key = ("legacy", legacy_calls)
+        previous = content
+        entry = questions.setdefault(
+            key, {"message": user_message, "answer": final_answer or "", "created_ticket": False, "chat": False}
+        )
+        if tool_name == "search_kb":
+            entry["chat"] = True
+        elif tool_name == "create_ticket":
+            entry["created_ticket"] = True
+    conn.close()
+
+    # Rows logged by /create-ticket alone are not chat questions
+    result = [q for q in questions.values() if q.pop("chat")]
+    return result[:limit] if limit else result
+
+
+def load_questions_from_jsonl(path: str, field: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get(field):
+                questions.append({"message": record[field], "answer": "", "created_ticket": False})
+            if limit and len(questions) >= limit:
+                break
+    return questions
+
+
+def apply_recorded_responses(questions: List[Dict[str, Any]], path: str) -> int:
+    """Recorded-response stand-in for the LLM: JSONL with message, answer and optional created_ticket"""
+    recorded = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recorded[record["message"]] = record
+    matched = 0
+    for q in questions:
+        record = recorded.get(q["message"])
+        if record:
+            q["answer"] = record.get("answer", "")
+            q["created_ticket"] = bool(record.get("created_ticket", False))
+            matched += 1
+    return matched
+
+
+# ---------- workers ----------
+def _init_worker(kb_path: str) -> None:
+    global _kb_path
+    _kb_path = kb_path
+    get_kb_index(kb_path)  # build the index once per process
+
+
+def _evaluate_chunk(task: Dict[str, Any]) -> List[List[tuple]]:
+    """For each question and config: (can_create_ticket, confidence, fast_path, ticket_created, top_kb_id)"""
+    index = get_kb_index(_kb_path)
+    questions = task["questions"]
+    all_kb_results = index.search_many([normalize_query(q["message"]) for q in questions], limit=5)
+
+    out = []
+    for q, kb_results_raw in zip(questions, all_kb_results):
+        per_config = []
+        for config in task["configs"]:
+            kb_results, top_score, can_create_ticket = route_kb_results(
+                kb_results_raw,
+                raw_threshold=config["raw_threshold"],
+                threshold=config["threshold"],
+                normalizer=config["normalizer"],
+            )
+            # The recorded model could only have created a ticket if tools are enabled
+            ticket_created = can_create_ticket and q["created_ticket"]
+            tool_calls = [("search_kb", {}, kb_results)]
+            if ticket_created:
+                tool_calls.append(("create_ticket", {}, {}))
+            confidence = determine_confidence_from_score(top_score, kb_results, tool_calls, q["answer"])
+            per_config.append(
+                (
+                    can_create_ticket,
+                    confidence,
+                    is_fast_path_eligible(kb_results, top_score, can_create_ticket),
+                    ticket_created,
+                    kb_results[0]["id"] if kb_results else None,
+                )
+            )
+        out.append(per_config)
+    return out
+
+
+def _chunks(questions: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for i in range(0, len(questions), size):
+        yield questions[i:i + size]
+
+
+# ---------- report ----------
+def evaluate(
+    questions: List[Dict[str, Any]],
+    configs: List[Dict[str, Any]],
+    kb_path: str,
+    workers: int,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    results: List[List[tuple]] = []
+    tasks = ({"questions": chunk, "configs": configs} for chunk in _chunks(questions, CHUNK_SIZE))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(kb_path,)) as pool:
+        for chunk_result in pool.map(_evaluate_chunk, tasks):
+            results.extend(chunk_result)
+    elapsed = time.perf_counter() - started
+
+    total = len(results) or 1
+    report: Dict[str, Any] = {
+        "questions": len(results),
+        "seconds": round(elapsed, 3),
+        "questions_per_second": round(len(results) / elapsed, 1) if elapsed else None,
+        "configs": [],
+    }
+    for i, config in enumerate(configs):
+        rows = [r[i] for r in results]
+        report["configs"].append(
+            {
+                **config,
+                "ticket_tools_enabled_rate": round(sum(r[0] for r in rows) / total, 4),
+                "ticket_rate": round(sum(r[3] for r in rows) / total, 4),
+                "fast_path_rate": round(sum(r[2] for r in rows) / total, 4),
+                "confidence": dict(Counter(r[1] for r in rows)),
+                "top_kb": dict(Counter(r[4] or "(none)" for r in rows).most_common(10)),
+            }
+        )
+
+    if len(configs) > 1:
+        # What changes for the same questions when moving from baseline to candidate
+        report["changes"] = {
+            "ticket_tools_flipped": sum(1 for r in results if r[0][0] != r[1][0]),
+            "fast_path_flipped": sum(1 for r in results if r[0][2] != r[1][2]),
+            "top_kb_changed": sum(1 for r in results if r[0][4] != r[1][4]),
+            "confidence_transitions": {
+                f"{a} -> {b}": n
+                for (a, b), n in Counter((r[0][1], r[1][1]) for r in results).most_common()
+                if a != b
+            },
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{'='*80}")
+    print(f"Questions: {report['questions']}  |  {report['seconds']}s  |  {report['questions_per_second']} q/s")
+    print(f"{'='*80}")
+    for config in report["configs"]:
+        print(
+            f"\n[{config['name']}] raw_threshold={config['raw_threshold']} "
+            f"threshold={config['threshold']} normalizer={config['normalizer']}"
+        )
+        print(f"  Ticket tools enabled: {config['ticket_tools_enabled_rate']:.1%}")
+        print(f"  Ticket rate (recorded): {config['ticket_rate']:.1%}")
+        print(f"  Fast-path eligible: {config['fast_path_rate']:.1%}")
+        print(f"  Confidence: {config['confidence']}")
+        print(f"  Top KB: {config['top_kb']}")
+    if "changes" in report:
+        changes = report["changes"]
+        print("\nChanges baseline → candidate:")
+        print(f"  Ticket tools flipped: {changes['ticket_tools_flipped']}")
+        print(f"  Fast path flipped: {changes['fast_path_flipped']}")
+        print(f"  Top KB article changed: {changes['top_kb_changed']}")
+        for transition, n in changes["confidence_transitions"].items():
+            print(f"  Confidence {transition}: {n}")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline evaluation of KB retrieval and routing")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="runs.db", help="runs.db to replay (default)")
+    source.add_argument("--jsonl", help="JSONL file with questions instead of runs.db")
+    parser.add_argument("--field", default="message", help="JSONL field holding the question")
+    parser.add_argument("--responses", help="JSONL with recorded model responses (message, answer, created_ticket)")
+    parser.add_argument("--kb", default="kb_seed.json", help="KB file")
+    parser.add_argument("--limit", type=int, help="Evaluate only the first N questions")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--raw-threshold", type=float, help="Candidate KB_SCORE_THRESHOLD_RAW")
+    parser.add_argument("--threshold", type=float, help="Candidate KB_SCORE_THRESHOLD")
+    parser.add_argument("--normalizer", type=float, help="Candidate score normalizer (currently /10.0)")
+    parser.add_argument("--json", action="store_true", help="Print report as JSON")
+    args = parser.parse_args()
+
+    if args.jsonl:
+        questions = load_questions_from_jsonl(args.jsonl, args.field, args.limit)
+    else:
+        if not os.path.exists(args.db):
+            sys.exit(f"Database not found: {args.db}")
+        questions = load_questions_from_db(args.db, args.limit)
+    if args.responses:
+        matched = apply_recorded_responses(questions, args.responses)
+        print(f"Recorded responses matched: {matched}/{len(questions)}", file=sys.stderr)
+    if not questions:
+        sys.exit("No questions to evaluate.")
+
+    configs = [
+        {
+            "name": "baseline",
+            "raw_threshold": KB_SCORE_THRESHOLD_RAW,
+            "threshold": KB_SCORE_THRESHOLD,
+            "normalizer": KB_SCORE_NORMALIZER,
+        }
+    ]
+    if args.raw_threshold is not None or args.threshold is not None or args.normalizer is not None:
+        configs.append(
+            {
+                "name": "candidate",
+                "raw_threshold": args.raw_threshold if args.raw_threshold is not None else KB_SCORE_THRESHOLD_RAW,
+                "threshold": args.threshold if args.threshold is not None else KB_SCORE_THRESHOLD,
+                "normalizer": args.normalizer if args.normalizer is not None else KB_SCORE_NORMALIZER,
+            }
+        )
+
+    report = evaluate(questions, configs, os.path.abspath(args.kb), max(1, args.workers))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
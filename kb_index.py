@@ -0,0 +1,560 @@
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Passage size is measured in characters so prompts stay predictable in tokens.
+# Overlap keeps a sentence that straddles a boundary retrievable from either side.
+PASSAGE_MAX_CHARS = 400
+PASSAGE_OVERLAP_CHARS = 100
+MAX_PASSAGES_PER_ARTICLE = 2
+# Loaded indexes (one per tenant KB) are kept in an LRU within this budget (KB_INDEX_MEMORY_MB)
+DEFAULT_KB_INDEX_MEMORY_MB = 256
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Typo tolerance: query words missing from the KB are corrected to the closest vocabulary
+# term within this many edits (shorter words are left alone, too many false corrections)
+FUZZY_MIN_WORD_LEN = 5
+FUZZY_LONG_WORD_LEN = 9  # from this length two edits are allowed
+FUZZY_MIN_TRIGRAM_OVERLAP = 0.3  # shared trigrams / query word trigrams, before edit distance
+MAX_MEMOIZED_CORRECTIONS = 10000
+
+# Simple keyword translation dictionary (RU -> EN)
+# This allows finding English articles from Russian queries
+# Note: words shorter than 3 characters are filtered, so we don't add short words
+TRANSLATIONS = {
+    'пароль': 'password',
+    'сброс': 'reset',
+    'платеж': 'payment',
+    'оплата': 'payment',
+    'не прошел': 'failed',  # Phrase as a whole, not individual words
+    'удаление': 'deletion',
+    'аккаунт': 'account',
+    'двухфакторная': 'two',
+    'двухфакторная аутентификация': 'two factor authentication',
+    'аутентификация': 'authentication',
+    'лимит': 'limit',
+    'ограничение': 'limit',
+    'api': 'api',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into lowercase word tokens (same notion of a word as \\b in search)"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def normalize_query(query: str) -> List[str]:
+    """Query → list of search words (normalized, RU→EN translated)"""
+    translations = TRANSLATIONS
+
+    # Normalize query: remove punctuation, convert to lowercase
+    query_normalized = re.sub(r'[^\w\s]', ' ', query.lower())
+    query_words_raw = [w.strip() for w in query_normalized.split() if len(w.strip()) > 2]
+    
+    # Translate words from Russian to English
+    query_words = []
+    for word in query_words_raw:
+        # Check translations for individual words
+        # Misspelled Russian keywords are mapped too: "платж" → "платеж" → "payment"
+        key = word if word in translations else _translation_key_for_typo(word)
+        if key:
+            query_words.append(translations[key])
+        else:
+            # Also add original word (in case it's already in English)
+            query_words.append(word)
+    
+    # Check phrases (e.g., "двухфакторная аутентификация")
+    query_lower = query.lower()
+    for phrase_ru, phrase_en in translations.items():
+        if len(phrase_ru.split()) > 1 and phrase_ru in query_lower:
+            # Add translated phrase as separate words
+            query_words.extend(phrase_en.split())
+    
+    return query_words
+
+
+def max_edits_for(word: str) -> int:
+    if len(word) < FUZZY_MIN_WORD_LEN:
+        return 0
+    return 2 if len(word) >= FUZZY_LONG_WORD_LEN else 1
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance with adjacent transpositions; stops early once above max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+@lru_cache(maxsize=MAX_MEMOIZED_CORRECTIONS)
+def _translation_key_for_typo(word: str) -> Optional[str]:
+    max_edits = max_edits_for(word)
+    if not max_edits:
+        return None
+    best = None
+    for key in TRANSLATIONS:
+        if " " in key:
+            continue
+        distance = edit_distance(word, key, max_edits)
+        if distance <= max_edits and (best is None or distance < best[0]):
+            best = (distance, key)
+    return best[1] if best else None
+
+
+def padded_trigrams(term: str) -> List[str]:
+    padded = f" {term} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class BaseTrigramIndex(ABC):
+    """Character trigrams → vocabulary terms, for substring lookups and typo correction;
+    storage is defined by subclasses"""
+
+    @abstractmethod
+    def term_count(self) -> int:
+        """Number of vocabulary terms"""
+
+    @abstractmethod
+    def term(self, term_idx: int) -> str:
+        """Vocabulary term by index"""
+
+    @abstractmethod
+    def trigram_postings(self, trigram: str) -> Sequence[int]:
+        """Ascending indexes of the terms containing trigram"""
+
+    def containing(self, word: str) -> List[str]:
+        """Vocabulary terms that contain word as a substring"""
+        if len(word) < 3:
+            terms = (self.term(i) for i in range(self.term_count()))
+            return [term for term in terms if word in term]
+        # Every trigram of the word occurs in such a term; start from the rarest one
+        postings = sorted((self.trigram_postings(word[i:i + 3]) for i in range(len(word) - 2)), key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        terms = (self.term(i) for i in sorted(candidates))
+        return [term for term in terms if word in term]
+
+    def closest(self, word: str, max_edits: int) -> Optional[str]:
+        """Closest term within max_edits; candidates are terms sharing enough trigrams with word"""
+        word_trigrams = set(padded_trigrams(word))
+        overlap: Dict[int, int] = {}
+        for trigram in word_trigrams:
+            for term_idx in self.trigram_postings(trigram):
+                overlap[term_idx] = overlap.get(term_idx, 0) + 1
+
+        min_shared = FUZZY_MIN_TRIGRAM_OVERLAP * len(word_trigrams)
+        best: Optional[Tuple[int, int, str]] = None
+        for term_idx, shared in sorted(overlap.items(), key=lambda x: -x[1]):
+            if shared < min_shared:
+                break
+            term = self.term(term_idx)
+            distance = edit_distance(word, term, max_edits)
+            if distance > max_edits:
+                continue
+            # Fewest edits wins, then most shared trigrams, then alphabetical for stability
+            key = (distance, -shared, term)
+            if best is None or key < best:
+                best = key
+        return best[2] if best else None
+
+
+class TermTrigramIndex(BaseTrigramIndex):
+    """In-memory trigram index, built from the vocabulary"""
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.terms: List[str] = []
+        self.trigrams: Dict[str, List[int]] = {}
+        for term in terms:
+            term_idx = len(self.terms)
+            self.terms.append(term)
+            for trigram in set(padded_trigrams(term)):
+                self.trigrams.setdefault(trigram, []).append(term_idx)
+
+    def term_count(self) -> int:
+        return len(self.terms)
+
+    def term(self, term_idx: int) -> str:
+        return self.terms[term_idx]
+
+    def trigram_postings(self, trigram: str) -> Sequence[int]:
+        return self.trigrams.get(trigram, [])
+
+    def memory_bytes(self) -> int:
+        # Rough: ~100 bytes per trigram key and per term, ~40 bytes per posting entry
+        entries = sum(len(p) for p in self.trigrams.values())
+        return (len(self.trigrams) + len(self.terms)) * 100 + entries * 40
+
+
+# ---------- ingestion ----------
+def chunk_article(
+    article: Dict[str, str],
+    max_chars: int = PASSAGE_MAX_CHARS,
+    overlap_chars: int = PASSAGE_OVERLAP_CHARS,
+) -> List[Dict[str, Any]]:
+    """Splits an article into overlapping passages with stable ids (<article_id>#<n>)"""
+    content = article.get("content", "")
+    # Word spans, so a passage never cuts a word in half
+    spans = [(m.start(), m.end()) for m in re.finditer(r"\S+", content)]
+
+    passages = []
+    i = 0
+    while i < len(spans):
+        start = spans[i][0]
+        j = i
+        # Take at least one word, then extend while we fit into max_chars
+        while j + 1 < len(spans) and spans[j + 1][1] - start <= max_chars:
+            j += 1
+        end = spans[j][1]
+        passages.append(
+            {
+                "passage_id": f"{article['id']}#{len(passages)}",
+                "article_id": article["id"],
+                "start": start,
+                "text": content[start:end],
+            }
+        )
+        if j + 1 >= len(spans):
+            break
+        # Step back so the next passage starts overlap_chars before this one ends
+        k = j + 1
+        while k - 1 > i and end - spans[k - 1][0] <= overlap_chars:
+            k -= 1
+        i = k
+
+    if not passages:
+        # Articles without content are still retrievable by title
+        passages.append(
+            {"passage_id": f"{article['id']}#0", "article_id": article["id"], "start": 0, "text": ""}
+        )
+    return passages
+
+
+class BaseKBIndex(ABC):
+    """Passage-level retrieval over an index; storage is defined by subclasses"""
+
+    def __init__(self) -> None:
+        self._corrections: "OrderedDict[str, str]" = OrderedDict()
+        self._fuzzy_lock = threading.Lock()
+
+    # ---- storage accessors ----
+    @abstractmethod
+    def term_postings(self, term: str) -> List[Tuple[int, int]]:
+        """[(passage_idx, term frequency)] for a term"""
+
+    @abstractmethod
+    def terms(self) -> Iterable[str]:
+        """Every term of the vocabulary"""
+
+    @abstractmethod
+    def term_trigrams(self) -> BaseTrigramIndex:
+        """Trigram index over the vocabulary; ready at load time, never built on the query path"""
+
+    @abstractmethod
+    def passage_count(self) -> int:
+        """Number of passages"""
+
+    @abstractmethod
+    def passage_text(self, idx: int) -> str:
+        """Lowercased "title + passage" text"""
+
+    @abstractmethod
+    def passage(self, idx: int) -> Dict[str, Any]:
+        """passage_id, article_id, start, text"""
+
+    @abstractmethod
+    def article(self, article_id: str) -> Dict[str, str]:
+        """Article by id (KeyError if unknown)"""
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        """Approximate resident size, used for the index cache budget"""
+
+    # ---- retrieval ----
+    def search(self, query_words: List[str], limit: int = 3) -> List[Dict[str, Any]]:
+        """Scores passages for already normalized query words, merges best passages per article"""
+        return self.search_many([query_words], limit=limit)[0]
+
+    def search_many(self, queries: List[List[str]], limit: int = 3) -> List[List[Dict[str, Any]]]:
+        """Batch search: each distinct word is looked up once for the whole batch"""
+        hits: Dict[str, Tuple[Dict[int, int], List[int]]] = {}
+        corrected_queries = []
+        for query_words in queries:
+            corrected = []
+            for word in query_words:
+                if word not in hits:
+                    hits[word] = self._word_hits(word)
+                exact, partial = hits[word]
+                if not exact and not partial:
+                    # Nothing matches as typed: score it as the closest vocabulary term instead
+                    word = self.correct_term(word)
+                    if word not in hits:
+                        hits[word] = self._word_hits(word)
+                corrected.append(word)
+            corrected_queries.append(corrected)
+        return [self._rank(query_words, hits, limit) for query_words in corrected_queries]
+
+    def correct_term(self, word: str) -> str:
+        """Closest vocabulary term for a misspelled word ("pasword" → "password"), or the word itself"""
+        max_edits = max_edits_for(word)
+        if not max_edits:
+            return word
+        with self._fuzzy_lock:
+            if word in self._corrections:
+                self._corrections.move_to_end(word)
+                return self._corrections[word]
+        corrected = self.term_trigrams().closest(word, max_edits) or word
+        with self._fuzzy_lock:
+            self._corrections[word] = corrected
+            if len(self._corrections) > MAX_MEMOIZED_CORRECTIONS:
+                self._corrections.popitem(last=False)
+        return corrected
+
+    def _word_hits(self, word: str) -> Tuple[Dict[int, int], List[int]]:
+        """(passage_idx → exact match count, passages with substring-only matches)"""
+        exact = dict(self.term_postings(word))
+        # Query words contain only word characters, so a substring match in passage text is
+        # always inside one token: look up vocabulary terms containing the word instead of
+        # scanning every passage
+        partial = set()
+        for term in self.term_trigrams().containing(word):
+            if term != word:
+                partial.update(idx for idx, _ in self.term_postings(term) if idx not in exact)
+        return exact, sorted(partial)
+
+    def _rank(
+        self,
+        query_words: List[str],
+        hits: Dict[str, Tuple[Dict[int, int], List[int]]],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        if not query_words:
+            return []
+
+        # Same scoring as the article-level search, applied per passage:
+        # +2 per exact word match, +1 for a substring-only match, +3 if the word is in the title
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for word in query_words:
+            exact, partial = hits[word]
+            for idx, tf in exact.items():
+                scores[idx] = scores.get(idx, 0) + tf * 2
+                matched[idx] = matched.get(idx, 0) + 1
+            for idx in partial:
+                scores[idx] = scores.get(idx, 0) + 1
+
+        for idx in list(scores):
+            title_lower = self.article(self.passage(idx)["article_id"])["title"].lower()
+            for word in query_words:
+                if word in title_lower:
+                    scores[idx] += 3
+
+        ranked = []
+        for idx, score in scores.items():
+            if score <= 0:
+                continue
+            match_ratio = matched.get(idx, 0) / len(query_words)
+            ranked.append((score * (1 + match_ratio), idx))
+        ranked.sort(key=lambda x: (-x[0], x[1]))
+
+        # Merge per article: article score = best passage score
+        by_article: Dict[str, List[Tuple[float, int]]] = {}
+        order: List[str] = []
+        for score, idx in ranked:
+            article_id = self.passage(idx)["article_id"]
+            if article_id not in by_article:
+                by_article[article_id] = []
+                order.append(article_id)
+            if len(by_article[article_id]) < MAX_PASSAGES_PER_ARTICLE:
+                by_article[article_id].append((score, idx))
+
+        results = []
+        for article_id in order[:limit]:
+            article = self.article(article_id)
+            hits = by_article[article_id]
+            results.append(
+                {
+                    "id": article_id,
+                    "title": article["title"],
+                    "snippet": self._merge_passages(article, [idx for _, idx in hits]),
+                    "url": article["url"],
+                    "score": hits[0][0],
+                    "passages": [
+                        {"passage_id": self.passage(idx)["passage_id"], "score": score}
+                        for score, idx in hits
+                    ],
+                }
+            )
+        return results
+
+    def _merge_passages(self, article: Dict[str, str], passage_idxs: List[int]) -> str:
+        """Joins passages in document order, overlapping ones merged into a single span"""
+        passages = [self.passage(i) for i in passage_idxs]
+        spans = sorted((p["start"], p["start"] + len(p["text"])) for p in passages)
+        merged: List[List[int]] = []
+        for start, end in spans:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return " … ".join(article["content"][start:end] for start, end in merged)
+
+
+class KBIndex(BaseKBIndex):
+    """In-memory passage index, built from parsed KB articles"""
+
+    def __init__(self, articles: List[Dict[str, str]]) -> None:
+        super().__init__()
+        self.articles: Dict[str, Dict[str, str]] = {a["id"]: a for a in articles}
+        self.passages: List[Dict[str, Any]] = []
+        # term -> [(passage_idx, term frequency)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        # Lowercased "title + passage" text
+        self.passage_texts: List[str] = []
+        self._memory_bytes: Optional[int] = None
+
+        for article in articles:
+            for passage in chunk_article(article):
+                idx = len(self.passages)
+                self.passages.append(passage)
+                text = (article["title"] + " " + passage["text"]).lower()
+                self.passage_texts.append(text)
+
+                counts: Dict[str, int] = {}
+                for token in tokenize(text):
+                    counts[token] = counts.get(token, 0) + 1
+                for token, tf in counts.items():
+                    self.postings.setdefault(token, []).append((idx, tf))
+
+        # Built with the index, so it's loaded (and warmed) together with it
+        self._term_trigrams = TermTrigramIndex(self.postings)
+
+    def term_postings(self, term: str) -> List[Tuple[int, int]]:
+        return self.postings.get(term, [])
+
+    def terms(self) -> Iterable[str]:
+        return self.postings.keys()
+
+    def term_trigrams(self) -> BaseTrigramIndex:
+        return self._term_trigrams
+
+    def passage_count(self) -> int:
+        return len(self.passages)
+
+    def passage_text(self, idx: int) -> str:
+        return self.passage_texts[idx]
+
+    def passage(self, idx: int) -> Dict[str, Any]:
+        return self.passages[idx]
+
+    def article(self, article_id: str) -> Dict[str, str]:
+        return self.articles[article_id]
+
+    def memory_bytes(self) -> int:
+        if self._memory_bytes is None:
+            # Rough: ~2 bytes per character of held text, ~100 bytes per posting entry
+            chars = sum(len(t) for t in self.passage_texts)
+            chars += sum(len(a.get("content", "")) + len(a.get("title", "")) for a in self.articles.values())
+            self._memory_bytes = chars * 2 + sum(len(p) for p in self.postings.values()) * 100
+            self._memory_bytes += self._term_trigrams.memory_bytes()
+        return self._memory_bytes
+
+
+# ---------- index cache ----------
+_index_lock = threading.Lock()
+# kb_path -> (mtime, index), least recently used first
+_index_cache: "OrderedDict[str, Tuple[float, BaseKBIndex]]" = OrderedDict()
+# One lock per KB so a slow load of one tenant doesn't block the others
+_load_locks: Dict[str, threading.Lock] = {}
+_memory_budget: Optional[int] = None  # bytes, see configure_kb_index_cache()
+
+
+def configure_kb_index_cache(memory_budget_mb: Optional[int] = None) -> int:
+    """Sets the cache budget, from KB_INDEX_MEMORY_MB unless given. Read here rather than at import
+    so a .env loaded by the app is honored; main.create_app() calls it, otherwise it runs on first use"""
+    global _memory_budget
+    if memory_budget_mb is None:
+        memory_budget_mb = int(os.getenv("KB_INDEX_MEMORY_MB", str(DEFAULT_KB_INDEX_MEMORY_MB)))
+    _memory_budget = memory_budget_mb * 1024 * 1024
+    return _memory_budget
+
+
+def kb_index_memory_budget() -> int:
+    return _memory_budget if _memory_budget is not None else configure_kb_index_cache()
+
+
+def _load_index(kb_path: str) -> BaseKBIndex:
+    # A compiled snapshot (kb_snapshot.py) is mmapped and shared between workers;
+    # without one, or if it's stale, the index is built from JSON as before
+    from kb_snapshot import SnapshotError, load_snapshot, snapshot_path_for
+
+    try:
+        return load_snapshot(kb_path)
+    except SnapshotError as e:
+        if os.path.exists(snapshot_path_for(kb_path)):
+            print(f"⚠️  {e}; building KB index from JSON")
+    with open(kb_path, "r", encoding="utf-8") as f:
+        return KBIndex(json.load(f))
+
+
+def get_kb_index(kb_path: str) -> BaseKBIndex:
+    """Returns index for kb_path, loaded on first use and rebuilt only when the file changes on disk"""
+    mtime = os.path.getmtime(kb_path)
+    with _index_lock:
+        cached = _index_cache.get(kb_path)
+        if cached and cached[0] == mtime:
+            _index_cache.move_to_end(kb_path)
+            return cached[1]
+        load_lock = _load_locks.setdefault(kb_path, threading.Lock())
+    with load_lock:
+        with _index_lock:
+            cached = _index_cache.get(kb_path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        index = _load_index(kb_path)
+        with _index_lock:
+            _index_cache[kb_path] = (mtime, index)
+            _index_cache.move_to_end(kb_path)
+            _evict_over_budget(keep=kb_path)
+        return index
+
+
+def _evict_over_budget(keep: str) -> None:
+    """Drops least recently used indexes until the cache fits the memory budget (caller holds _index_lock)"""
+    budget = kb_index_memory_budget()
+    total = sum(index.memory_bytes() for _, index in _index_cache.values())
+    for kb_path in list(_index_cache):
+        if total <= budget:
+            break
+        if kb_path == keep:
+            continue
+        _, index = _index_cache.pop(kb_path)
+        _load_locks.pop(kb_path, None)
+        total -= index.memory_bytes()
+        print(f"♻️  Evicted KB index {kb_path} ({index.memory_bytes() // 1024} KiB) from cache")
+
+
+def kb_index_cache_stats() -> Dict[str, Any]:
+    with _index_lock:
+        sizes = {kb_path: index.memory_bytes() for kb_path, (_, index) in _index_cache.items()}
+    return {"indexes": len(sizes), "memory_bytes": sum(sizes.values()), "budget_bytes": kb_index_memory_budget()}
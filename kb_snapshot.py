@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Binary KB index snapshots, memory-mapped read-only by every worker.
+
+Compile once per KB change (e.g. at deploy):
+    python kb_snapshot.py kb_seed.json            # writes kb_seed.kbsnap
+
+Workers then mmap the snapshot instead of parsing JSON and building the index,
+so startup doesn't grow with KB size and the pages are shared between
+`uvicorn --workers N` processes through the page cache.
+
+Layout (little-endian):
+    header   magic "KBSNAP" + u16 format version + u32 section count
+    table    per section: 8-byte name, u64 offset, u64 length
+    META     JSON: source KB size/mtime/sha256, counts, chunking parameters
+    STRS     UTF-8 string blob referenced by (offset, length) pairs below
+    ARTS     per article: id, title, content, url as 4 × (u32 offset, u32 length)
+    PSGS     per passage: u32 article_idx, u32 start, u32 passage_no, text and lowered text as 2 × (u32, u32)
+    TERMS    sorted vocabulary: u32 offsets (term_count + 1) followed by UTF-8 term bytes
+    POSTS    u32 offsets into POSTD per term (term_count + 1)
+    POSTD    u32 pairs (passage_idx, tf)
+    TRIGS    sorted trigrams of the vocabulary: u32 offsets (trigram_count + 1) followed by UTF-8 bytes
+    TRIGP    u32 offsets into TRIGD per trigram (trigram_count + 1)
+    TRIGD    u32 term indexes (into TERMS), ascending per trigram
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from kb_index import (
+    PASSAGE_MAX_CHARS,
+    PASSAGE_OVERLAP_CHARS,
+    BaseKBIndex,
+    BaseTrigramIndex,
+    KBIndex,
+    TermTrigramIndex,
+)
+
+MAGIC = b"KBSNAP"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<6sHI")
+_SECTION = struct.Struct("<8sQQ")
+_ALIGN = 8
+_U32 = struct.Struct("<I")
+SECTION_NAMES = ("META", "STRS", "ARTS", "PSGS", "TERMS", "POSTS", "POSTD", "TRIGS", "TRIGP", "TRIGD")
+
+
+def snapshot_path_for(kb_path: str) -> str:
+    return os.path.splitext(kb_path)[0] + ".kbsnap"
+
+
+def _source_info(kb_path: str) -> Dict[str, Any]:
+    stat = os.stat(kb_path)
+    return {"kb_size": stat.st_size, "kb_mtime_ns": stat.st_mtime_ns}
+
+
+# ---------- compile ----------
+class _Strings:
+    def __init__(self) -> None:
+        self.blob = bytearray()
+
+    def add(self, text: str) -> Tuple[int, int]:
+        data = text.encode("utf-8")
+        offset = len(self.blob)
+        self.blob += data
+        return offset, len(data)
+
+
+def _u32(values: List[int]) -> bytes:
+    arr = array("I", values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def compile_snapshot(kb_path: str, out_path: Optional[str] = None) -> str:
+    """Builds the index from JSON and writes it as a snapshot; returns snapshot path"""
+    out_path = out_path or snapshot_path_for(kb_path)
+    with open(kb_path, "rb") as f:
+        raw = f.read()
+    index = KBIndex(json.loads(raw.decode("utf-8")))
+
+    strings = _Strings()
+    article_ids = list(index.articles)
+    article_pos = {article_id: i for i, article_id in enumerate(article_ids)}
+    arts: List[int] = []
+    for article_id in article_ids:
+        article = index.articles[article_id]
+        for field in ("id", "title", "content", "url"):
+            arts.extend(strings.add(article.get(field, "")))
+
+    psgs: List[int] = []
+    for idx, passage in enumerate(index.passages):
+        passage_no = int(passage["passage_id"].rsplit("#", 1)[1])
+        psgs.extend((article_pos[passage["article_id"]], passage["start"], passage_no))
+        psgs.extend(strings.add(passage["text"]))
+        psgs.extend(strings.add(index.passage_texts[idx]))
+
+    # Vocabulary sorted by UTF-8 bytes, so lookups are a binary search over the mapped file
+    terms = sorted(index.postings, key=lambda t: t.encode("utf-8"))
+    term_blob = bytearray()
+    term_offsets = [0]
+    post_offsets = [0]
+    postd: List[int] = []
+    for term in terms:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        for passage_idx, tf in index.postings[term]:
+            postd.extend((passage_idx, tf))
+        post_offsets.append(len(postd) // 2)
+
+    # Trigram postings refer to terms by their position in the sorted vocabulary
+    trigram_index = TermTrigramIndex(terms)
+    trigrams = sorted(trigram_index.trigrams, key=lambda t: t.encode("utf-8"))
+    trig_blob = bytearray()
+    trig_offsets = [0]
+    trigp_offsets = [0]
+    trigd: List[int] = []
+    for trigram in trigrams:
+        trig_blob += trigram.encode("utf-8")
+        trig_offsets.append(len(trig_blob))
+        trigd.extend(trigram_index.trigrams[trigram])
+        trigp_offsets.append(len(trigd))
+
+    meta = {
+        **_source_info(kb_path),
+        "kb_sha256": hashlib.sha256(raw).hexdigest(),
+        "created_at": time.time(),
+        "article_count": len(article_ids),
+        "passage_count": len(index.passages),
+        "term_count": len(terms),
+        "trigram_count": len(trigrams),
+        "passage_max_chars": PASSAGE_MAX_CHARS,
+        "passage_overlap_chars": PASSAGE_OVERLAP_CHARS,
+    }
+    sections = [
+        (b"META", json.dumps(meta).encode("utf-8")),
+        (b"STRS", bytes(strings.blob)),
+        (b"ARTS", _u32(arts)),
+        (b"PSGS", _u32(psgs)),
+        (b"TERMS", _u32(term_offsets) + bytes(term_blob)),
+        (b"POSTS", _u32(post_offsets)),
+        (b"POSTD", _u32(postd)),
+        (b"TRIGS", _u32(trig_offsets) + bytes(trig_blob)),
+        (b"TRIGP", _u32(trigp_offsets)),
+        (b"TRIGD", _u32(trigd)),
+    ]
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, data in sections:
+        offset += -offset % _ALIGN
+        table.append((name, offset, len(data)))
+        offset += len(data)
+
+    # Write next to the target and rename: running workers keep their mapping of the old file
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for name, section_offset, length in table:
+            f.write(_SECTION.pack(name, section_offset, length))
+        for (name, data), (_, section_offset, _) in zip(sections, table):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+# ---------- load ----------
+class SnapshotError(Exception):
+    """Snapshot is missing, of another format version, truncated/corrupt, or stale for its KB file"""
+
+
+def _find_sorted(count: int, key: bytes, item_at) -> int:
+    """Index of key among count byte strings sorted ascending (item_at(i) → bytes), or -1"""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if item_at(mid) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < count and item_at(lo) == key:
+        return lo
+    return -1
+
+
+class SnapshotTrigramIndex(BaseTrigramIndex):
+    """Trigram index read from the snapshot's TRIGS/TRIGP/TRIGD sections, nothing built at load"""
+
+    def __init__(self, index: "SnapshotIndex", sections: Dict[str, memoryview]) -> None:
+        self._index = index
+        self._count = index.meta["trigram_count"]
+        trigrams = sections["TRIGS"]
+        self._offsets = trigrams[:4 * (self._count + 1)].cast("I")
+        self._blob = trigrams[4 * (self._count + 1):]
+        self._post_offsets = sections["TRIGP"].cast("I")
+        self._postd = sections["TRIGD"].cast("I")
+
+    def _trigram_at(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def term_count(self) -> int:
+        return self._index.meta["term_count"]
+
+    def term(self, term_idx: int) -> str:
+        return self._index._term_at(term_idx).decode("utf-8")
+
+    def trigram_postings(self, trigram: str) -> Sequence[int]:
+        i = _find_sorted(self._count, trigram.encode("utf-8"), self._trigram_at)
+        if i < 0:
+            return []
+        return self._postd[self._post_offsets[i]:self._post_offsets[i + 1]]
+
+
+class SnapshotIndex(BaseKBIndex):
+    """Read-only index over a memory-mapped snapshot; nothing is decoded until a query touches it"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise SnapshotError(f"{path} is truncated ({size} bytes)")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Validated before any memoryview is taken, so the mapping can still be closed on error
+        try:
+            table = self._read_table(path)
+        except SnapshotError:
+            self._mm.close()
+            raise
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            self._mm.close()
+            raise SnapshotError(f"{path} is corrupt: {type(e).__name__}: {e}") from e
+
+        view = memoryview(self._mm)
+        self._sections: Dict[str, memoryview] = {
+            name: view[offset:offset + length] for name, (offset, length) in table.items()
+        }
+        self._strs = self._sections["STRS"]
+        self._arts = self._sections["ARTS"].cast("I")
+        self._psgs = self._sections["PSGS"].cast("I")
+        term_count = self.meta["term_count"]
+        terms = self._sections["TERMS"]
+        self._term_offsets = terms[:4 * (term_count + 1)].cast("I")
+        self._term_blob = terms[4 * (term_count + 1):]
+        self._post_offsets = self._sections["POSTS"].cast("I")
+        self._postd = self._sections["POSTD"].cast("I")
+        self._term_trigrams = SnapshotTrigramIndex(self, self._sections)
+        self._article_idx: Optional[Dict[str, int]] = None
+
+    def _read_table(self, path: str) -> Dict[str, Tuple[int, int]]:
+        """Checks header, section table and section sizes against the file; sets self.meta"""
+        mm = self._mm
+        magic, version, count = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a KB snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        if sys.byteorder != "little":
+            raise SnapshotError("KB snapshots are little-endian; rebuild the index from JSON on this host")
+        if _HEADER.size + count * _SECTION.size > len(mm):
+            raise SnapshotError(f"{path} is truncated (section table)")
+
+        table: Dict[str, Tuple[int, int]] = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(mm, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(mm):
+                raise SnapshotError(f"{path} is truncated (section {name!r} ends past the end of the file)")
+            table[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+        missing = [name for name in SECTION_NAMES if name not in table]
+        if missing:
+            raise SnapshotError(f"{path} is missing sections {missing}")
+
+        meta_offset, meta_length = table["META"]
+        self.meta = json.loads(mm[meta_offset:meta_offset + meta_length])
+
+        def u32_at(section: str, i: int) -> int:
+            return _U32.unpack_from(mm, table[section][0] + 4 * i)[0]
+
+        def expect(section: str, length: int) -> None:
+            if table[section][1] != length:
+                raise SnapshotError(f"{path}: section {section} is {table[section][1]} bytes, expected {length}")
+
+        terms, trigrams = self.meta["term_count"], self.meta["trigram_count"]
+        expect("ARTS", self.meta["article_count"] * 8 * 4)
+        expect("PSGS", self.meta["passage_count"] * 7 * 4)
+        expect("POSTS", (terms + 1) * 4)
+        expect("POSTD", u32_at("POSTS", terms) * 8)
+        expect("TERMS", (terms + 1) * 4 + u32_at("TERMS", terms))
+        expect("TRIGP", (trigrams + 1) * 4)
+        expect("TRIGD", u32_at("TRIGP", trigrams) * 4)
+        expect("TRIGS", (trigrams + 1) * 4 + u32_at("TRIGS", trigrams))
+        return table
+
+    def _str(self, offset: int, length: int) -> str:
+        return str(self._strs[offset:offset + length], "utf-8")
+
+    def _term_at(self, i: int) -> bytes:
+        return bytes(self._term_blob[self._term_offsets[i]:self._term_offsets[i + 1]])
+
+    def _find_term(self, term: str) -> int:
+        return _find_sorted(self.meta["term_count"], term.encode("utf-8"), self._term_at)
+
+    def term_postings(self, term: str) -> List[Tuple[int, int]]:
+        i = self._find_term(term)
+        if i < 0:
+            return []
+        start, end = self._post_offsets[i] * 2, self._post_offsets[i + 1] * 2
+        data = self._postd[start:end]
+        return list(zip(data[0::2], data[1::2]))
+
+    def terms(self) -> Iterable[str]:
+        for i in range(self.meta["term_count"]):
+            yield self._term_at(i).decode("utf-8")
+
+    def term_trigrams(self) -> BaseTrigramIndex:
+        return self._term_trigrams
+
+    def passage_count(self) -> int:
+        return self.meta["passage_count"]
+
+    def passage_text(self, idx: int) -> str:
+        base = idx * 7
+        return self._str(self._psgs[base + 5], self._psgs[base + 6])
+
+    def passage(self, idx: int) -> Dict[str, Any]:
+        base = idx * 7
+        article_idx, start, passage_no = self._psgs[base], self._psgs[base + 1], self._psgs[base + 2]
+        article_id = self._article_field(article_idx, 0)
+        return {
+            "passage_id": f"{article_id}#{passage_no}",
+            "article_id": article_id,
+            "start": start,
+            "text": self._str(self._psgs[base + 3], self._psgs[base + 4]),
+        }
+
+    def _article_field(self, article_idx: int, field: int) -> str:
+        base = article_idx * 8 + field * 2
+        return self._str(self._arts[base], self._arts[base + 1])
+
+    def article(self, article_id: str) -> Dict[str, str]:
+        if self._article_idx is None:
+            self._article_idx = {
+                self._article_field(i, 0): i for i in range(self.meta["article_count"])
+            }
+        i = self._article_idx[article_id]
+        return {
+            "id": article_id,
+            "title": self._article_field(i, 1),
+            "content": self._article_field(i, 2),
+            "url": self._article_field(i, 3),
+        }
+
+    def memory_bytes(self) -> int:
+        # Mapped pages live in the shared page cache, but count them so the budget stays conservative
+        return len(self._mm)
+
+
+def load_snapshot(kb_path: str, snapshot_path: Optional[str] = None) -> SnapshotIndex:
+    """Maps the snapshot for kb_path; raises SnapshotError if it's missing or stale"""
+    snapshot_path = snapshot_path or snapshot_path_for(kb_path)
+    if not os.path.exists(snapshot_path):
+        raise SnapshotError(f"No snapshot at {snapshot_path}")
+    index = SnapshotIndex(snapshot_path)
+    # Size + mtime is enough to notice an edited KB without reading it
+    source = _source_info(kb_path)
+    if any(index.meta.get(k) != v for k, v in source.items()):
+        raise SnapshotError(f"{snapshot_path} is stale for {kb_path}, recompile it")
+    if (index.meta.get("passage_max_chars"), index.meta.get("passage_overlap_chars")) != (
+        PASSAGE_MAX_CHARS,
+        PASSAGE_OVERLAP_CHARS,
+    ):
+        raise SnapshotError(f"{snapshot_path} was built with different chunking parameters")
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile a KB JSON file into a binary index snapshot")
+    parser.add_argument("kb", nargs="?", default="kb_seed.json")
+    parser.add_argument("-o", "--output", help="Snapshot path (default: <kb>.kbsnap)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = compile_snapshot(args.kb, args.output)
+    index = SnapshotIndex(path)
+    print(
+        f"✅ {path}: {index.meta['article_count']} articles, {index.meta['passage_count']} passages, "
+        f"{index.meta['term_count']} terms, {index.meta['trigram_count']} trigrams, {os.path.getsize(path)} bytes "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Callable, Deque, Optional, Tuple, Type
+
+LLM_DEADLINE_SECONDS = 30.0  # total budget for one completion, retries and hedges included
+LLM_MAX_ATTEMPTS = 3
+LLM_ATTEMPT_TIMEOUT = 12.0  # one hung attempt must not use up the whole deadline
+LLM_BACKOFF_BASE = 0.5  # seconds, full jitter on top
+LLM_BACKOFF_MAX = 4.0
+HEDGE_MIN_SAMPLES = 20  # no hedging until we know the latency distribution
+HEDGE_MIN_DELAY = 1.0  # never hedge earlier than this, even if p95 is lower
+LATENCY_WINDOW = 200
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures that open the breaker
+BREAKER_RESET_SECONDS = 30.0  # open → half-open after this long
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[Type[BaseException], ...]:
+    """Timeouts, connection errors, 429 and 5xx. openai is imported here, not at module import,
+    so loading the app doesn't pay for the SDK before the warm-up does"""
+    import openai
+
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        TimeoutError,
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open after a cool-down (one trial call)"""
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError("LLM circuit breaker is open")
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError("LLM circuit breaker is half-open, trial call in flight")
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"⚠️  LLM circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class ResilientCompletions:
+    """Wraps a chat.completions.create-like callable with deadlines, retries, hedging and a breaker.
+
+    The wrapped client must not retry on its own (OpenAI(max_retries=0)): its retries would
+    multiply ours and hide failures from the breaker."""
+
+    def __init__(
+        self,
+        create_fn: Callable[..., Any],
+        deadline: float = LLM_DEADLINE_SECONDS,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT,
+        hedge: bool = False,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.create_fn = create_fn
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        # Abandoned attempts (lost hedge races, timed out calls) finish here in the background
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+
+    def create(self, **kwargs: Any) -> Any:
+        self.breaker.before_call()
+        deadline_at = time.monotonic() + self.deadline
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                resp = self._attempt(kwargs, min(remaining, self.attempt_timeout))
+                self.breaker.record_success()
+                return resp
+            except retryable_errors() as e:
+                last_error = e
+                print(f"⚠️  LLM attempt {attempt}/{self.max_attempts} failed: {type(e).__name__}: {e}")
+            except Exception:
+                # Bad request, auth error etc. - retrying won't help, and it's not an outage
+                self.breaker.record_success()
+                raise
+
+            if attempt < self.max_attempts:
+                backoff = random.uniform(0, min(LLM_BACKOFF_BASE * 2 ** (attempt - 1), LLM_BACKOFF_MAX))
+                time.sleep(max(0.0, min(backoff, deadline_at - time.monotonic())))
+
+        self.breaker.record_failure()
+        raise last_error or TimeoutError(f"LLM call exceeded {self.deadline:.0f}s deadline")
+
+    def _timed_call(self, kwargs: Any, timeout: float) -> Any:
+        started = time.monotonic()
+        # Per-request timeout, so the HTTP call itself never outlives the deadline
+        resp = self.create_fn(**kwargs, timeout=timeout)
+        self.latency.add(time.monotonic() - started)
+        return resp
+
+    def _attempt(self, kwargs: Any, remaining: float) -> Any:
+        """One attempt; with hedging, a second identical request is sent if the first is slower than p95"""
+        futures = [self._pool.submit(self._timed_call, kwargs, remaining)]
+        started = time.monotonic()
+
+        hedge_after = self.latency.percentile(0.95) if self.hedge else None
+        if hedge_after is not None:
+            hedge_after = max(hedge_after, HEDGE_MIN_DELAY)
+            done, _ = wait(futures, timeout=min(hedge_after, remaining))
+            if not done and time.monotonic() - started < remaining:
+                print(f"⏱️  LLM call slower than p95 ({hedge_after:.2f}s), sending hedged request")
+                futures.append(
+                    self._pool.submit(self._timed_call, kwargs, remaining - (time.monotonic() - started))
+                )
+
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            left = remaining - (time.monotonic() - started)
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None:
+            raise error
+        raise TimeoutError(f"LLM call did not finish within {remaining:.1f}s")
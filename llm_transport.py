@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+TRANSPORT_MODES = ("live", "record", "replay", "cache")
+DEFAULT_STORE_PATH = "llm_store.db"
+# Request parameters that don't change the completion and are left out of the fingerprint
+_IGNORED_PARAMS = {"timeout", "extra_headers"}
+
+
+def _completion_type() -> Any:
+    # Imported on first use: the SDK types take a noticeable part of the app's import time
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion
+
+
+class ReplayMissError(LookupError):
+    """Replay mode and no recorded response for this request"""
+
+
+def _plain(value: Any) -> Any:
+    """Converts SDK objects (e.g. assistant messages appended to history) to plain JSON data"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def request_fingerprint(params: Dict[str, Any]) -> str:
+    """Stable hash of a completion request (model, messages, tools, ...)"""
+    canonical = {k: _plain(v) for k, v in params.items() if k not in _IGNORED_PARAMS and v is not None}
+    blob = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """Fingerprint → compressed completion JSON, in a single SQLite file"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+              fingerprint TEXT PRIMARY KEY,
+              response BLOB NOT NULL,
+              latency_ms REAL,
+              created_at REAL
+            )
+            """
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread: completions are called from worker threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT response, latency_ms FROM completions WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"response": json.loads(zlib.decompress(row[0])), "latency_ms": row[1]}
+
+    def put(self, fingerprint: str, response: Dict[str, Any], latency_ms: float) -> None:
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (fingerprint, response, latency_ms, created_at) VALUES (?, ?, ?, ?)",
+            (fingerprint, blob, latency_ms, time.time()),
+        )
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionTransport:
+    """chat.completions.create replacement with live / record / replay / cache modes
+
+    - live: call OpenAI
+    - record: call OpenAI and persist fingerprint → response
+    - replay: serve only from the store (no network), optionally with simulated latency
+    - cache: read-through cache for exact-repeat requests, OpenAI on miss
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        live_factory: Callable[[], Callable[..., Any]],
+        store: Optional[ResponseStore] = None,
+        replay_latency: Optional[str] = None,
+    ) -> None:
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown LLM transport mode: {mode} (expected one of {TRANSPORT_MODES})")
+        if mode != "live" and store is None:
+            raise ValueError(f"LLM transport mode '{mode}' needs a response store")
+        self.mode = mode
+        self.store = store
+        # "recorded" replays the latency measured when recording, a number is a fixed delay in seconds
+        self.replay_latency = replay_latency
+        self._live_factory = live_factory
+        self._live: Optional[Callable[..., Any]] = None
+        self._live_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, live_factory: Callable[[], Callable[..., Any]]) -> "CompletionTransport":
+        mode = os.getenv("LLM_TRANSPORT", "live")
+        store = ResponseStore(os.getenv("LLM_STORE_PATH", DEFAULT_STORE_PATH)) if mode != "live" else None
+        return cls(mode, live_factory, store=store, replay_latency=os.getenv("LLM_REPLAY_LATENCY"))
+
+    def _live_client(self) -> Callable[..., Any]:
+        # The OpenAI client is only created when a live call is actually needed,
+        # so replay mode works without an API key
+        if self._live is None:
+            with self._live_lock:
+                if self._live is None:
+                    self._live = self._live_factory()
+        return self._live
+
+    def _live_call(self, **params: Any) -> Any:
+        return self._live_client()(**params)
+
+    def warm_up(self) -> None:
+        """Imports the SDK types and creates the live client (not in replay mode) ahead of the first request"""
+        _completion_type()
+        if self.mode != "replay":
+            self._live_client()
+
+    def create(self, **params: Any) -> Any:
+        if self.mode == "live":
+            return self._live_call(**params)
+
+        fingerprint = request_fingerprint(params)
+        if self.mode in ("replay", "cache"):
+            stored = self.store.get(fingerprint)
+            if stored is not None:
+                self.hits += 1
+                self._simulate_latency(stored["latency_ms"])
+                return _completion_type().model_validate(stored["response"])
+            self.misses += 1
+            if self.mode == "replay":
+                raise ReplayMissError(f"No recorded completion for request {fingerprint[:12]}")
+
+        started = time.perf_counter()
+        resp = self._live_call(**params)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.store.put(fingerprint, resp.model_dump(), latency_ms)
+        return resp
+
+    def _simulate_latency(self, recorded_ms: Optional[float]) -> None:
+        if self.mode != "replay" or not self.replay_latency:
+            return
+        if self.replay_latency == "recorded":
+            delay = (recorded_ms or 0) / 1000
+        else:
+            delay = float(self.replay_latency)
+        if delay > 0:
+            time.sleep(delay)
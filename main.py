@@ -1,44 +1,117 @@
-import json
-import os
-import re
-import sqlite3
-from typing import Any, Dict, List, Optional
+import time
+
+# Start of the startup profile: everything imported below counts as "imports"
+IMPORT_STARTED = time.perf_counter()
+
+import json  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+import sqlite3  # noqa: E402
+import threading  # noqa: E402
+import uuid  # noqa: E402
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait  # noqa: E402
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set  # noqa: E402
+
+from dotenv import load_dotenv  # noqa: E402
+from fastapi import APIRouter, FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+from pydantic import BaseModel, Field  # noqa: E402
+
+from admission import (  # noqa: E402
+    AdmissionController,
+    AdmissionRejected,
+    admission_keys,
+    rejection_headers,
+    size_threadpool,
+)
+from analytics import AnalyticsStore  # noqa: E402
+from canonical_answers import CANONICAL_THREAD_ID, CanonicalAnswerStore  # noqa: E402
+from kb_index import configure_kb_index_cache, get_kb_index, kb_index_cache_stats, normalize_query  # noqa: E402
+from llm_resilience import CircuitOpenError, ResilientCompletions, retryable_errors  # noqa: E402
+from llm_transport import CompletionTransport  # noqa: E402
+from routing import (  # noqa: E402
+    KB_SCORE_THRESHOLD,
+    determine_confidence_from_score,
+    is_clarifying_question,
+    route_kb_results,
+)
+from startup_profile import StartupProfile  # noqa: E402
+from static_assets import PrecompressedStaticFiles, make_static_files  # noqa: E402
+from tenants import DEFAULT_TENANT_ID, Tenant, TenantRegistry, UnknownTenantError  # noqa: E402
+from ticket_dedup import TicketSimilarityIndex  # noqa: E402
+from tickets import OutboxDispatcher, TicketStore, make_tracker_adapter  # noqa: E402
+from tools import ToolCall, ToolExecutor, ToolRegistry  # noqa: E402
+
+startup_profile = StartupProfile(IMPORT_STARTED)
+startup_profile.record("imports", time.perf_counter() - IMPORT_STARTED)
 
-from dotenv import load_dotenv
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from openai import OpenAI
+KB_PATH = "kb_seed.json"
+DB_PATH = "runs.db"
+# Bump whenever a table or migration in runs.db changes (any store), see init_db()
+SCHEMA_VERSION = 4
 
-load_dotenv()
-client = OpenAI()
+BATCH_MAX_ITEMS = 500
+BATCH_DEFAULT_CONCURRENCY = 4
+BATCH_MAX_CONCURRENCY = 16
 
-app = FastAPI(title="KB Support Agent")
+ticket_store = TicketStore(DB_PATH, dedup=TicketSimilarityIndex())
+canonical_store = CanonicalAnswerStore(DB_PATH)
+analytics = AnalyticsStore(DB_PATH)
 
-KB_PATH = "kb_seed.json"
-DB_PATH = "runs.db"
+# Built by create_app(): the clients read their configuration from the environment, after .env is loaded
+transport: CompletionTransport
+llm: ResilientCompletions
+outbox_dispatcher: OutboxDispatcher
+admission: AdmissionController
+tenants: TenantRegistry
+static_files: PrecompressedStaticFiles
+
+# Routes are registered here and included by create_app()
+router = APIRouter()
 
 
 # ---------- storage / logging ----------
-def init_db() -> None:
+def init_db() -> bool:
+    """Creates and migrates every table in runs.db (runs and the stores sharing the file).
+    Skipped when PRAGMA user_version is already SCHEMA_VERSION, so restarts run no DDL.
+    Returns whether the schema was (re)applied."""
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS runs (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          thread_id TEXT,
-          user_message TEXT,
-          tool_name TEXT,
-          tool_args TEXT,
-          tool_result TEXT,
-          final_answer TEXT
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return False
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              thread_id TEXT,
+              user_message TEXT,
+              tool_name TEXT,
+              tool_args TEXT,
+              tool_result TEXT,
+              final_answer TEXT,
+              created_at REAL,
+              run_id TEXT
+            )
+            """
         )
-        """
-    )
-    conn.commit()
-    conn.close()
+        # Databases created before runs were timestamped / grouped per chat call
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(runs)")}
+        if "created_at" not in columns:
+            cur.execute("ALTER TABLE runs ADD COLUMN created_at REAL")
+        if "run_id" not in columns:
+            cur.execute("ALTER TABLE runs ADD COLUMN run_id TEXT")
+        conn.commit()
+
+        ticket_store.create_schema()
+        canonical_store.create_schema()
+        analytics.init()
+        # Only once everything above succeeded, so a failed migration is retried next start
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        return True
+    finally:
+        conn.close()
 
 
 def log_run(
@@ -48,13 +121,15 @@ def log_run(
     tool_args: Dict[str, Any],
     tool_result: Any,
     final_answer: str,
+    run_id: Optional[str] = None,
 ) -> None:
+    """One row per tool call; rows of one /chat call share run_id"""
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
         """
-        INSERT INTO runs (thread_id, user_message, tool_name, tool_args, tool_result, final_answer)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO runs (thread_id, user_message, tool_name, tool_args, tool_result, final_answer, created_at, run_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             thread_id,
@@ -63,121 +138,90 @@ def log_run(
             json.dumps(tool_args, ensure_ascii=False),
             json.dumps(tool_result, ensure_ascii=False),
             final_answer,
+            time.time(),
+            run_id,
         ),
     )
     conn.commit()
     conn.close()
 
 
+def record_run_metrics(
+    tenant_id: str,
+    kb_results: List[Dict[str, Any]],
+    response: Dict[str, Any],
+    all_tool_calls: List[tuple],
+    iterations: int,
+    started: float,
+) -> None:
+    """Adds one /chat call to the hourly analytics rollups; never fails the request"""
+    ticket_priority = None
+    for name, _, result in all_tool_calls:
+        if name == "create_ticket" and isinstance(result, dict) and "ticket_id" in result:
+            ticket_priority = result.get("priority") or "P2"
+    if response.get("error"):
+        outcome = "error"
+    elif response.get("degraded"):
+        outcome = "degraded"
+    elif response.get("precomputed"):
+        outcome = "precomputed"
+    else:
+        outcome = "model"
+    try:
+        analytics.record(
+            tenant_id=tenant_id,
+            top_kb=kb_results[0]["id"] if kb_results else None,
+            confidence=response.get("confidence", "Low"),
+            ticket_priority=ticket_priority,
+            tool_iterations=iterations,
+            outcome=outcome,
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️  Failed to record analytics: {e}")
+
+
 # ---------- "tools" implementation ----------
 def load_kb() -> List[Dict[str, str]]:
     with open(KB_PATH, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def search_kb(query: str, limit: int = 3) -> List[Dict[str, str]]:
+def search_kb(query: str, limit: int = 3, kb_path: str = KB_PATH) -> List[Dict[str, str]]:
     # Keyword-based search (word matching + scoring) with basic RU→EN mapping (MVP).
     # For production, it's recommended to replace with semantic search using embeddings/RAG.
-    kb = load_kb()
-    
-    # Simple keyword translation dictionary (RU -> EN)
-    # This allows finding English articles from Russian queries
-    # Note: words shorter than 3 characters are filtered, so we don't add short words
-    translations = {
-        'пароль': 'password',
-        'сброс': 'reset',
-        'платеж': 'payment',
-        'оплата': 'payment',
-        'не прошел': 'failed',  # Phrase as a whole, not individual words
-        'удаление': 'deletion',
-        'аккаунт': 'account',
-        'двухфакторная': 'two',
-        'двухфакторная аутентификация': 'two factor authentication',
-        'аутентификация': 'authentication',
-        'лимит': 'limit',
-        'ограничение': 'limit',
-        'api': 'api',
-    }
-    
-    # Normalize query: remove punctuation, convert to lowercase
-    query_normalized = re.sub(r'[^\w\s]', ' ', query.lower())
-    query_words_raw = [w.strip() for w in query_normalized.split() if len(w.strip()) > 2]
-    
-    # Translate words from Russian to English
-    query_words = []
-    for word in query_words_raw:
-        # Check translations for individual words
-        if word in translations:
-            query_words.append(translations[word])
-        else:
-            # Also add original word (in case it's already in English)
-            query_words.append(word)
-    
-    # Check phrases (e.g., "двухфакторная аутентификация")
-    query_lower = query.lower()
-    for phrase_ru, phrase_en in translations.items():
-        if len(phrase_ru.split()) > 1 and phrase_ru in query_lower:
-            # Add translated phrase as separate words
-            query_words.extend(phrase_en.split())
-    
+    query_words = normalize_query(query)
     if not query_words:
         return []
     
-    scored = []
-    for item in kb:
-        # Combine title and content for search
-        text = (item["title"] + " " + item["content"]).lower()
-        
-        # Count matches for each word in the query
-        score = 0
-        matched_words = 0
-        
-        for word in query_words:
-            # Search word as a whole word (with word boundaries), not as substring
-            word_pattern = r'\b' + re.escape(word) + r'\b'
-            matches = len(re.findall(word_pattern, text))
-            if matches > 0:
-                score += matches * 2  # Bonus for exact word match
-                matched_words += 1
-            else:
-                # If no exact match, search as substring (for partial matches)
-                if word in text:
-                    score += 1
-        
-        # Bonus for match in title (more important than in content)
-        title_lower = item["title"].lower()
-        for word in query_words:
-            if word in title_lower:
-                score += 3
-        
-        # Add only if at least one match found
-        if score > 0:
-            # Normalize score: consider percentage of matched words
-            match_ratio = matched_words / len(query_words) if query_words else 0
-            final_score = score * (1 + match_ratio)  # Bonus for more matched words
-            scored.append((final_score, item))
-    
-    # Sort by descending score
-    scored.sort(key=lambda x: x[0], reverse=True)
-    
-    results = []
-    for score, it in scored[:limit]:
-        results.append(
-            {
-                "id": it["id"],
-                "title": it["title"],
-                "snippet": it["content"][:220] + ("..." if len(it["content"]) > 220 else ""),
-                "url": it["url"],
-                "score": score,  # Save score for use in confidence calculation
-            }
-        )
-    return results
-
-
-def create_ticket(title: str, description: str, priority: str = "P2") -> Dict[str, str]:
-    # MVP: just a "fake" ticket id. In a real project, integrate with Jira/Linear/Zendesk API.
-    ticket_id = f"TCK-{abs(hash(title + description)) % 100000:05d}"
-    return {"ticket_id": ticket_id, "status": "created", "priority": priority}
+    # Scoring happens at passage level, so long articles contribute their relevant part
+    # to the prompt instead of the first 220 characters
+    return get_kb_index(kb_path).search(query_words, limit=limit)
+
+
+def search_kb_many(queries: List[str], limit: int = 3, kb_path: str = KB_PATH) -> List[List[Dict[str, str]]]:
+    """Retrieval for a batch of queries in one pass over the index"""
+    return get_kb_index(kb_path).search_many([normalize_query(q) for q in queries], limit=limit)
+
+
+def create_ticket(
+    title: str,
+    description: str,
+    priority: str = "P2",
+    thread_id: Optional[str] = None,
+    tenant_id: str = DEFAULT_TENANT_ID,
+) -> Dict[str, str]:
+    # Only enqueues: the ticket is stored with a deterministic id and delivered to the
+    # tracker by the outbox dispatcher in the background, so callers never wait on the tracker.
+    # tenant_id comes from the request (tool context), never from the model
+    ticket = ticket_store.enqueue(title, description, priority=priority, thread_id=thread_id, tenant_id=tenant_id)
+    if ticket["created"] or ticket.get("attached"):
+        outbox_dispatcher.notify()
+    result = {"ticket_id": ticket["ticket_id"], "status": ticket["status"], "priority": ticket["priority"]}
+    if ticket.get("attached"):
+        # Near-duplicate of an open ticket: the report was attached to it
+        result["attached_to_existing"] = True
+    return result
 
 
 def calculate_relevance_score(query: str, kb_item: Optional[Dict]) -> float:
@@ -205,49 +249,50 @@ def calculate_relevance_score(query: str, kb_item: Optional[Dict]) -> float:
 
 
 # ---------- OpenAI tool schemas ----------
-# Note: search_kb is no longer in TOOLS, as retrieval is now mandatory and performed in backend
-# Model receives KB results automatically in the prompt
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "create_ticket",
-            "description": (
-                "Create a support ticket ONLY when:\n"
-                "1. The Knowledge Base results (provided above) contain no relevant information for the user's question, AND\n"
-                "2. The user's question is clear and complete (not vague or ambiguous).\n"
-                "\n"
-                "IMPORTANT:\n"
-                "- Knowledge Base has already been searched automatically - you have the results above\n"
-                "- If KB has relevant information, use it to answer - DO NOT create a ticket\n"
-                "- Only create a ticket if KB results are empty or completely irrelevant\n"
-                "- If the question is unclear, provide basic steps from KB first, then ask 1-2 clarifying questions\n"
-                "- For repeated payment failures, use priority P1"
-            ),
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "title": {"type": "string"},
-                    "description": {"type": "string"},
-                    "priority": {"type": "string", "default": "P2"},
-                },
-                "required": ["title", "description"],
+# Note: search_kb is registered for dispatch but has no schema, so it is not in TOOLS:
+# retrieval is now mandatory and performed in backend, model receives KB results in the prompt
+TOOL_REGISTRY = ToolRegistry()
+TOOL_REGISTRY.register(
+    "search_kb",
+    lambda query, limit=3: search_kb(query=query, limit=int(limit)),
+    timeout=5.0,
+)
+TOOL_REGISTRY.register(
+    "create_ticket",
+    create_ticket,
+    schema={
+        "description": (
+            "Create a support ticket ONLY when:\n"
+            "1. The Knowledge Base results (provided above) contain no relevant information for the user's question, AND\n"
+            "2. The user's question is clear and complete (not vague or ambiguous).\n"
+            "\n"
+            "IMPORTANT:\n"
+            "- Knowledge Base has already been searched automatically - you have the results above\n"
+            "- If KB has relevant information, use it to answer - DO NOT create a ticket\n"
+            "- Only create a ticket if KB results are empty or completely irrelevant\n"
+            "- If the question is unclear, provide basic steps from KB first, then ask 1-2 clarifying questions\n"
+            "- For repeated payment failures, use priority P1"
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "description": {"type": "string"},
+                "priority": {"type": "string", "default": "P2"},
             },
+            "required": ["title", "description"],
         },
     },
-]
+    timeout=10.0,
+)
+TOOLS = TOOL_REGISTRY.schemas()
+
+# Tool calls from one model turn run concurrently, each bounded by its own timeout
+tool_executor = ToolExecutor(TOOL_REGISTRY)
 
 
 def tool_dispatch(name: str, args: Dict[str, Any]) -> Any:
-    if name == "search_kb":
-        return search_kb(query=args["query"], limit=int(args.get("limit", 3)))
-    if name == "create_ticket":
-        return create_ticket(
-            title=args["title"],
-            description=args["description"],
-            priority=args.get("priority", "P2"),
-        )
-    raise ValueError(f"Unknown tool: {name}")
+    return TOOL_REGISTRY.dispatch(name, args)
 
 
 def build_structured_response(
@@ -466,78 +511,26 @@ def clean_answer_text(text: str) -> str:
     return text.strip()
 
 
-def is_clarifying_question(text: str) -> bool:
-    """Determines if answer is a clarifying question"""
-    # Consider clarifying only if there are many questions or answer is mostly questions
-    q_count = text.count("?")
-    if q_count >= 2:
-        return True
-    
-    # If one question, but it takes up most of the answer
-    if q_count == 1:
-        # Check that question is not at the end of a short answer after providing information
-        text_lower = text.lower()
-        clarifying_patterns = [
-            r"to help (?:you|better|more|precisely)",
-            r"could you (?:please )?(?:clarify|specify|tell me|provide)",
-            r"which (?:one|method|way|option)",
-            r"what (?:error|message|method|happened|did you)",
-            r"are you (?:trying|using|getting)",
-            r"do you (?:have|see|use|get)",
-            r"please (?:clarify|specify|provide|tell)",
-            r"чтобы помочь",
-            r"уточните",
-            r"какой|какая|какое",
-        ]
-        
-        # If there are clarifying question patterns AND answer is short (< 50 words)
-        # then it's a clarifying question
-        for pattern in clarifying_patterns:
-            if re.search(pattern, text_lower):
-                if len(text.split()) < 50:
-                    return True
-        
-        # If answer is very short and mostly consists of a question
-        if len(text.split()) < 20:
-            return True
-    
-    return False
-
-
-def determine_confidence_from_score(
-    top_score: float,
-    sources: List[Dict],
-    all_tool_calls: List[tuple],
-    answer: str
-) -> str:
-    """Determines confidence based on retrieval score"""
-    
-    # If KB sources exist and score is normal — this is NOT Low, even if there's 1 question at the end
-    if sources and top_score >= 0.3:
-        if top_score > 0.6:
-            return "High"
-        return "Medium"
-    
-    # Further — only if no sources, then clarifications = Low
-    if is_clarifying_question(answer):
-        return "Low"
-    
-    # If ticket created and no sources - Low
-    if any(name == "create_ticket" for name, _, _ in all_tool_calls) and not sources:
-        return "Low"
-    
-    # If sources exist but low score - Medium
-    if sources:
-        return "Medium"
-    
-    # Default Low
-    return "Low"
+def render_kb_answer(kb_results: List[Dict]) -> str:
+    """Answer built from KB results only (used when the model gives no text or is unavailable)"""
+    answer = f"Found {len(kb_results)} relevant articles in knowledge base:\n\n"
+    for item in kb_results[:3]:
+        answer += f"**{item.get('title', 'Untitled')}**\n"
+        answer += f"{item.get('snippet', '')}\n"
+        answer += f"📎 {item.get('url', '')}\n\n"
+    return answer
 
 
 # ---------- API ----------
 class ChatIn(BaseModel):
     message: str
     thread_id: Optional[str] = "demo-thread"
+    tenant_id: Optional[str] = None  # which product KB to answer from (default: kb_seed.json)
+
+
+class BatchChatIn(BaseModel):
+    items: List[ChatIn] = Field(..., max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = None  # concurrent LLM calls for this batch
 
 
 class CreateTicketIn(BaseModel):
@@ -545,23 +538,90 @@ class CreateTicketIn(BaseModel):
     description: str
     priority: str = "P2"
     thread_id: Optional[str] = "demo-thread"
+    tenant_id: Optional[str] = None  # product the ticket belongs to (default tenant if omitted)
+
+
+def warm_up_canonical_answers(tenant: Tenant) -> Dict[str, int]:
+    """(Re)generates stored answers for the tenant's canonical questions whose article changed"""
+
+    def generate(question: str, kb_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = ChatIn(message=question, thread_id=CANONICAL_THREAD_ID, tenant_id=tenant.tenant_id)
+        return answer_chat(payload, kb_results=kb_results, tenant=tenant, log=False, use_precomputed=False)
+
+    return canonical_store.warm_up(tenant.kb_path, generate)
+
+
+def _warm_up_all_tenants() -> None:
+    for tenant_id in tenants.tenant_ids():
+        tenant = tenants.get(tenant_id)
+        try:
+            counts = warm_up_canonical_answers(tenant)
+            print(f"📚 Canonical answers for {tenant_id}: {counts}")
+        except Exception as e:
+            print(f"⚠️  Canonical answer warm-up failed for {tenant_id}: {type(e).__name__}: {e}")
 
 
-@app.on_event("startup")
 def _startup() -> None:
-    init_db()
+    with startup_profile.step("db"):
+        migrated = init_db()
+        ticket_store.load()
+        canonical_store.reload()
+    print(f"🗄️  {DB_PATH}: schema {'migrated to' if migrated else 'already at'} version {SCHEMA_VERSION}")
+    outbox_dispatcher.start()
+    threads = size_threadpool(admission)
+    print(f"🚦 Worker threads: {threads} ({admission.max_in_flight} in flight + {admission.max_queue} queued /chat + headroom)")
+    # Serving starts right away (/healthz passes), /readyz waits for the warm-up
+    threading.Thread(target=_warm_up, name="startup-warmup", daemon=True).start()
+    # Opt-in: generating answers costs LLM calls; in the background so startup isn't blocked
+    if os.getenv("CANONICAL_WARMUP", "0") == "1":
+        threading.Thread(target=_warm_up_all_tenants, name="canonical-warmup", daemon=True).start()
+
+
+def _warm_up() -> None:
+    """Loads what the first requests would otherwise pay for, then lets /readyz pass"""
+    try:
+        with startup_profile.step("kb_index"):
+            get_kb_index(KB_PATH)
+    except Exception as e:
+        startup_profile.mark_failed(f"KB index {KB_PATH}: {type(e).__name__}: {e}")
+        return
+    try:
+        with startup_profile.step("llm_client"):
+            transport.warm_up()
+            retryable_errors()
+    except Exception as e:
+        # e.g. no OPENAI_API_KEY: KB-only routes still work, so don't stay unready; the failed
+        # step shows up in /readyz and chats return an error until the key is configured
+        print(f"⚠️  LLM client warm-up failed: {type(e).__name__}: {e}")
+    startup_profile.mark_ready()
+
 
+def _shutdown() -> None:
+    outbox_dispatcher.stop()
 
-@app.get("/")
-def read_root():
-    return FileResponse("static/index.html")
 
+# Probes are async so they run on the event loop: a threadpool saturated by /chat must not
+# make the liveness check time out
+@router.get("/healthz")
+async def healthz() -> Dict[str, str]:
+    """Liveness: the process is up and serving"""
+    return {"status": "ok"}
 
-# Mount static files (after defining routes)
-app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@router.get("/readyz")
+async def readyz() -> Any:
+    """Readiness: KB index and DB are warmed up; 503 until then. Includes the startup profile"""
+    report = startup_profile.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
 
-@app.get("/history")
+
+@router.get("/")
+async def read_root(request: Request):
+    # Same negotiation and ETag/304 handling as /static/index.html
+    return await static_files.get_response("index.html", request.scope)
+
+
+@router.get("/history")
 def get_history(thread_id: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
     """Get conversation history"""
     conn = sqlite3.connect(DB_PATH)
@@ -602,7 +662,7 @@ def get_history(thread_id: Optional[str] = None, limit: int = 20) -> Dict[str, A
     return {"history": history}
 
 
-@app.get("/threads")
+@router.get("/threads")
 def get_threads() -> Dict[str, Any]:
     """Get list of all thread IDs"""
     conn = sqlite3.connect(DB_PATH)
@@ -620,14 +680,16 @@ def get_threads() -> Dict[str, Any]:
     return {"threads": threads}
 
 
-@app.post("/create-ticket")
+@router.post("/create-ticket")
 def create_ticket_endpoint(payload: CreateTicketIn) -> Dict[str, Any]:
     """Create ticket via API"""
     try:
         ticket_info = create_ticket(
             title=payload.title,
             description=payload.description,
-            priority=payload.priority
+            priority=payload.priority,
+            thread_id=payload.thread_id,
+            tenant_id=tenants.get(payload.tenant_id).tenant_id,
         )
         
         # Log ticket creation
@@ -637,7 +699,7 @@ def create_ticket_endpoint(payload: CreateTicketIn) -> Dict[str, Any]:
             tool_name="create_ticket",
             tool_args={"title": payload.title, "description": payload.description, "priority": payload.priority},
             tool_result=ticket_info,
-            final_answer=f"Ticket {ticket_info['ticket_id']} created"
+            final_answer=f"Ticket {ticket_info['ticket_id']} {ticket_info['status']}"
         )
         
         return {
@@ -649,40 +711,184 @@ def create_ticket_endpoint(payload: CreateTicketIn) -> Dict[str, Any]:
         return {"error": str(e), "ticket_id": None}
 
 
-@app.post("/chat")
-def chat(payload: ChatIn) -> Dict[str, Any]:
+@router.get("/tickets/{ticket_id}")
+def get_ticket(ticket_id: str) -> Dict[str, Any]:
+    """Get ticket and its delivery status"""
+    ticket = ticket_store.get(ticket_id)
+    if not ticket:
+        return {"error": "Ticket not found", "ticket_id": ticket_id}
+    return ticket
+
+
+@router.get("/admission")
+def get_admission_stats() -> Dict[str, Any]:
+    """Admission control counters: how close we are to saturation"""
+    return admission.stats()
+
+
+@router.get("/analytics")
+def get_analytics(hours: int = 24) -> Dict[str, Any]:
+    """Chats, ticket rate, confidence, top KB articles and latency over the last N hours (from rollups)"""
+    now = time.time()
+    return analytics.summary(since=now - max(1, hours) * 3600, until=now)
+
+
+@router.get("/tenants")
+def get_tenants() -> Dict[str, Any]:
+    """Configured tenants and how much of the KB index cache budget is in use"""
+    return {"tenants": tenants.tenant_ids(), "index_cache": kb_index_cache_stats()}
+
+
+def client_key(request: Request) -> str:
+    """Key for the per-client admission bucket (ADMISSION_CLIENT_KEY decides where it comes from)"""
+    return admission.client_key(request.client.host if request.client else "unknown", request.headers)
+
+
+@router.post("/chat")
+def chat(payload: ChatIn, request: Request) -> Any:
+    thread_id = payload.thread_id or "demo-thread"
+    client_host = client_key(request)
+    try:
+        tenant = tenants.get(payload.tenant_id)
+    except UnknownTenantError as e:
+        return JSONResponse(status_code=404, content={"error": True, "detail": str(e)})
+    try:
+        # Cheap checks first: token buckets per thread_id/client and global
+        admission.admit(admission_keys(thread_id, client_host))
+        # Each chat fans out to up to three completions, cap how many run at once
+        with admission.upstream_slot():
+            return answer_chat(payload, tenant=tenant)
+    except AdmissionRejected as e:
+        print(f"🚦 Rejected /chat for thread {thread_id} ({client_host}): {e.reason}")
+        return JSONResponse(
+            status_code=429,
+            content={"error": True, "detail": e.reason, "retry_after": e.retry_after},
+            headers=rejection_headers(e),
+        )
+
+
+def run_batch(run_item: Callable[[int], Dict[str, Any]], count: int, concurrency: int) -> Iterator[Dict[str, Any]]:
+    """Runs run_item(0..count-1), at most concurrency at a time, yielding results as they complete.
+
+    Items are submitted only as earlier ones finish, so if the client goes away (the generator
+    is no longer advanced, or is closed) at most `concurrency` items are still running"""
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    pending: Set[Future] = set()
+    next_index = 0
+    try:
+        while next_index < count or pending:
+            while next_index < count and len(pending) < concurrency:
+                pending.add(pool.submit(run_item, next_index))
+                next_index += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@router.post("/chat/batch")
+def chat_batch(payload: BatchChatIn, request: Request) -> Any:
+    """Answers many messages at once, streaming NDJSON lines as they complete"""
+    try:
+        # The batch is charged once to the client; items are then charged per thread (see run_item)
+        admission.admit([f"client:{client_key(request)}"])
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=429,
+            content={"error": True, "detail": e.reason, "retry_after": e.retry_after},
+            headers=rejection_headers(e),
+        )
+    # More threads than the batch share of upstream slots would only wait for a slot
+    max_concurrency = min(BATCH_MAX_CONCURRENCY, admission.max_batch_in_flight)
+    concurrency = max(1, min(payload.concurrency or BATCH_DEFAULT_CONCURRENCY, max_concurrency))
+    items = payload.items
+
+    # Retrieval for the whole batch in one pass per tenant KB: each distinct query word is looked up once
+    item_tenants: List[Optional[Tenant]] = []
+    by_kb: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        try:
+            tenant = tenants.get(item.tenant_id)
+        except UnknownTenantError:
+            tenant = None
+        item_tenants.append(tenant)
+        if tenant is not None:
+            by_kb.setdefault(tenant.kb_path, []).append(index)
+    all_kb_results: List[List[Dict[str, Any]]] = [[] for _ in items]
+    for kb_path, indexes in by_kb.items():
+        results = search_kb_many([items[i].message for i in indexes], limit=5, kb_path=kb_path)
+        for i, kb_results in zip(indexes, results):
+            all_kb_results[i] = kb_results
+
+    def run_item(index: int) -> Dict[str, Any]:
+        item = items[index]
+        thread_id = item.thread_id or "demo-thread"
+        line: Dict[str, Any] = {"index": index, "thread_id": thread_id}
+        if item_tenants[index] is None:
+            line["error"] = {"status": 404, "detail": f"Unknown tenant: {item.tenant_id}"}
+            return line
+        try:
+            # Global bucket, plus the thread's bucket when the item names its thread: items without
+            # a thread_id all default to the same one and would rate-limit each other. No per-client
+            # bucket here, the batch itself already bounds this client's concurrency
+            admission.admit([f"thread:{thread_id}"] if "thread_id" in item.model_fields_set and item.thread_id else [])
+            with admission.upstream_slot(batch=True):
+                line["response"] = answer_chat(item, kb_results=all_kb_results[index], tenant=item_tenants[index])
+        except AdmissionRejected as e:
+            line["error"] = {"status": 429, "detail": e.reason, "retry_after": e.retry_after}
+        except Exception as e:
+            line["error"] = {"status": 500, "detail": f"{type(e).__name__}: {e}"}
+        return line
+
+    def stream():
+        for line in run_batch(run_item, len(items), concurrency):
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    print(f"📦 Batch of {len(items)} messages, concurrency {concurrency}")
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def answer_chat(
+    payload: ChatIn,
+    kb_results: Optional[List[Dict[str, Any]]] = None,
+    tenant: Optional[Tenant] = None,
+    log: bool = True,
+    use_precomputed: bool = True,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    run_id = uuid.uuid4().hex  # groups this call's rows in runs
     user_msg = payload.message
     thread_id = payload.thread_id or "demo-thread"
+    tenant = tenant or tenants.get(payload.tenant_id)
 
     # IMPORTANT: Retrieval is now mandatory - always search KB first
-    kb_results = search_kb(user_msg, limit=5)
-    
-    # Filter KB results by relevance threshold
-    # Show only relevant sources (score >= 0.25) and maximum 2 sources
-    KB_SCORE_THRESHOLD_RAW = 2.5  # Threshold in raw score (approximately corresponds to 0.25 in normalized)
-    kb_results_filtered = [x for x in kb_results if x.get("score", 0) >= KB_SCORE_THRESHOLD_RAW]
-    kb_results = kb_results_filtered[:2]  # Show maximum 2 sources
+    # (batch requests pass results retrieved for the whole batch)
+    if kb_results is None:
+        kb_results = search_kb(user_msg, limit=5, kb_path=tenant.kb_path)
     
-    # Determine top score for confidence from search_kb results
-    # Use score that already accounts for RU→EN translations and correct calculation logic
-    top_score = 0.0
-    if kb_results:
-        # Take score from first (best) result
-        top_score_raw = kb_results[0].get("score", 0.0)
-        # Normalize score (approximately: score usually from 0 to ~20-30, normalize to 0-1)
-        # Can adjust normalization coefficient depending on actual score values
-        top_score = min(top_score_raw / 10.0, 1.0)
-    
-    # TICKET CREATION CONTROL: determine if model can create tickets
-    # If KB found and score is normal → disable tools (model cannot create ticket)
-    # If KB not found or low score → enable tools (model can call create_ticket)
-    KB_SCORE_THRESHOLD = 0.2  # Relevance threshold (can be adjusted)
-    can_create_ticket = not kb_results or top_score < KB_SCORE_THRESHOLD
+    # Filter KB results by relevance threshold and decide if model can create tickets
+    # (thresholds live in routing.py, so offline evaluation uses the same decisions)
+    kb_results, top_score, can_create_ticket = route_kb_results(kb_results)
     
     # Check for repeated issues for automatic escalation
     escalation_keywords = ["still", "again", "second time", "repeated", "still failing", "still not working"]
     is_repeated_issue = any(keyword in user_msg.lower() for keyword in escalation_keywords)
 
+    # Paraphrase of a canonical question: serve its stored answer without calling the model
+    # (repeated issues are escalated, stored answers don't know about that)
+    if use_precomputed and kb_results and not is_repeated_issue:
+        precomputed = canonical_store.lookup(tenant.kb_path, user_msg, kb_results)
+        if precomputed is not None:
+            print(f"📚 Serving precomputed answer for {kb_results[0]['id']}")
+            precomputed["precomputed"] = True
+            if log:
+                log_run(
+                    thread_id, user_msg, "search_kb", {"query": user_msg}, kb_results, precomputed["answer"], run_id
+                )
+                record_run_metrics(tenant.tenant_id, kb_results, precomputed, [], 0, started)
+            return precomputed
+
     # Build prompt with KB results
     kb_context = ""
     if kb_results:
@@ -706,16 +912,14 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
          else "You CANNOT create tickets - KB has relevant information, use it to answer the user.")
     )
     
+    # Allowed topics come from the tenant's KB configuration
+    topics = "".join(f"- {topic}\n" for topic in tenant.topics)
     system_content = (
-        "You are a product support assistant. You ONLY answer questions about:\n"
-        "- Password reset\n"
-        "- Payment failures\n"
-        "- API rate limits\n"
-        "- Account deletion\n"
-        "- Two-factor authentication\n"
+        f"You are {tenant.assistant}. You ONLY answer questions about:\n"
+        f"{topics}"
         "\n"
-        "If the question is NOT about these topics, politely say: 'I can only help with product support topics "
-        "(password reset, payment issues, rate limits, account deletion, 2FA). "
+        f"If the question is NOT about these topics, politely say: 'I can only help with {tenant.name} support topics "
+        f"({tenant.topics_summary}). "
         "For other questions, I'm not the right assistant.'\n"
         "\n"
         "Your response structure:\n"
@@ -788,7 +992,7 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
     print("="*80 + "\n")
 
     try:
-        resp = client.chat.completions.create(
+        resp = llm.create(
             model="gpt-4o-mini",
             messages=messages,
             tools=tools_for_model,
@@ -827,6 +1031,7 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
             messages.append(message)
             
             # Execute tool calls (only create_ticket available, search_kb no longer in TOOLS)
+            calls = []
             for tc in tool_calls:
                 name = tc.function.name
                 # search_kb should no longer be called via tool calling (retrieval mandatory in backend)
@@ -834,18 +1039,31 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
                     # This shouldn't happen, but just in case use already obtained results
                     print(f"⚠️  Warning: Model tried to call search_kb, but it's no longer a tool. Using pre-fetched results.")
                     all_tool_calls.append(("search_kb", {"query": user_msg}, kb_results))
+                    # Every tool_call_id needs a tool message, otherwise the next request is rejected
+                    messages.append(
+                        {
+                            "role": "tool",
+                            "tool_call_id": tc.id,
+                            "name": name,
+                            "content": json.dumps(kb_results, ensure_ascii=False),
+                        }
+                    )
                     continue
-                
-                args = json.loads(tc.function.arguments)
-                result = tool_dispatch(name, args)
-                all_tool_calls.append((name, args, result))
-                
+                calls.append(ToolCall(call_id=tc.id, name=name, arguments=tc.function.arguments))
+
+            # Independent calls run concurrently; failures and timeouts come back
+            # as {"error": {...}} results so the model can react to them
+            for outcome in tool_executor.run(calls, context={"tenant_id": tenant.tenant_id}):
+                status = "ok" if outcome.ok else "error"
+                print(f"🔧 {outcome.call.name}: {status} in {outcome.duration_ms:.0f}ms")
+                all_tool_calls.append((outcome.call.name, outcome.args, outcome.result))
+
                 messages.append(
                     {
                         "role": "tool",
-                        "tool_call_id": tc.id,
-                        "name": name,
-                        "content": json.dumps(result, ensure_ascii=False),
+                        "tool_call_id": outcome.call.call_id,
+                        "name": outcome.call.name,
+                        "content": json.dumps(outcome.result, ensure_ascii=False),
                     }
                 )
 
@@ -857,13 +1075,13 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
             
             if iteration >= max_iterations - 1:
                 print("⚠️  Last iteration - disabling tools to force text response")
-                resp2 = client.chat.completions.create(
+                resp2 = llm.create(
                     model="gpt-4o-mini",
                     messages=messages,
                     tools=None,  # Disable tools to get text response
                 )
             else:
-                resp2 = client.chat.completions.create(
+                resp2 = llm.create(
                     model="gpt-4o-mini",
                     messages=messages,
                     tools=tools_for_model,  # Use same tools as in first request
@@ -889,11 +1107,7 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
                     ticket_info = result
             
             if kb_results:
-                final_answer = f"Found {len(kb_results)} relevant articles in knowledge base:\n\n"
-                for item in kb_results[:3]:
-                    final_answer += f"**{item.get('title', 'Untitled')}**\n"
-                    final_answer += f"{item.get('snippet', '')}\n"
-                    final_answer += f"📎 {item.get('url', '')}\n\n"
+                final_answer = render_kb_answer(kb_results)
             elif ticket_info:
                 final_answer = f"✅ Created support ticket **{ticket_info.get('ticket_id', 'N/A')}** with priority {ticket_info.get('priority', 'P2')}.\n\nOur support team will contact you soon."
             else:
@@ -904,8 +1118,9 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
             all_tool_calls.insert(0, ("search_kb", {"query": user_msg}, kb_results))
         
         # Log (great for resume)
-        for name, args, result in all_tool_calls:
-            log_run(thread_id, user_msg, name, args, result, final_answer)
+        if log:
+            for name, args, result in all_tool_calls:
+                log_run(thread_id, user_msg, name, args, result, final_answer, run_id)
         
         # If tool calls were not invoked but answer is empty
         if not all_tool_calls and not final_answer:
@@ -928,7 +1143,9 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
         print(f"Actions: {structured_response['actions_taken']}")
         print(f"Confidence: {structured_response['confidence']}")
         print("="*80 + "\n")
-        
+
+        if log:
+            record_run_metrics(tenant.tenant_id, kb_results, structured_response, all_tool_calls, iteration, started)
         return structured_response
     
     except Exception as e:
@@ -941,8 +1158,28 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
         traceback.print_exc()
         print("="*80 + "\n")
         
+        # Upstream is down or slow, but KB results are already in hand: degrade to a
+        # KB-rendered answer instead of an error
+        if kb_results and isinstance(e, (CircuitOpenError, *retryable_errors())):
+            print("↩️  Degrading to KB-rendered answer")
+            final_answer = render_kb_answer(kb_results)
+            all_tool_calls = [("search_kb", {"query": user_msg}, kb_results)]
+            if log:
+                log_run(thread_id, user_msg, "search_kb", {"query": user_msg}, kb_results, final_answer, run_id)
+            structured_response = build_structured_response(
+                final_answer=final_answer,
+                all_tool_calls=all_tool_calls,
+                user_message=user_msg,
+                kb_results=kb_results,
+                top_score=top_score
+            )
+            structured_response["degraded"] = True
+            if log:
+                record_run_metrics(tenant.tenant_id, kb_results, structured_response, all_tool_calls, 0, started)
+            return structured_response
+        
         error_msg = f"Error processing request: {str(e)}"
-        return {
+        error_response = {
             "answer": error_msg,
             "sources": [],
             "next_steps": ["Try again", "Check your connection", "Contact support"],
@@ -950,4 +1187,50 @@ def chat(payload: ChatIn) -> Dict[str, Any]:
             "confidence": "Low",
             "error": True
         }
-
+        if log:
+            record_run_metrics(tenant.tenant_id, kb_results, error_response, [], 0, started)
+        return error_response
+
+
+def _openai_completions() -> Any:
+    # Imported here, so the SDK's import time is paid by the startup warm-up, not at import
+    from openai import OpenAI
+
+    # Retries, hedging and timeouts are done by ResilientCompletions, not the SDK
+    return OpenAI(max_retries=0).chat.completions.create
+
+
+def create_app() -> FastAPI:
+    """Builds the app. Nothing heavy happens here: the OpenAI client is created by the
+    startup warm-up (or on first use), the DB and KB index are prepared at startup."""
+    global transport, llm, outbox_dispatcher, admission, tenants, static_files
+
+    with startup_profile.step("config"):
+        load_dotenv()
+        # Completions go through a pluggable transport: live, record, replay or cache (LLM_TRANSPORT),
+        # so benchmarks and local development can run offline from recorded responses
+        transport = CompletionTransport.from_env(_openai_completions)
+        # ...wrapped in the resilience layer: deadline, jittered retries,
+        # optional hedged request after p95 latency, circuit breaker
+        llm = ResilientCompletions(transport.create, hedge=os.getenv("LLM_HEDGE", "0") == "1")
+        outbox_dispatcher = OutboxDispatcher(ticket_store, make_tracker_adapter())
+        admission = AdmissionController(
+            client_key_source=os.getenv("ADMISSION_CLIENT_KEY", "peer"),
+            trusted_proxies=int(os.getenv("ADMISSION_TRUSTED_PROXIES", "1")),
+        )
+        tenants = TenantRegistry(default_kb_path=KB_PATH)  # KB_TENANTS_DIR
+        configure_kb_index_cache()  # KB_INDEX_MEMORY_MB
+
+    with startup_profile.step("app"):
+        application = FastAPI(title="KB Support Agent")
+        application.include_router(router)
+        # Built assets (python build_static.py) if present: precompressed, fingerprinted, cached
+        static_files = make_static_files()
+        application.mount("/static", static_files, name="static")
+        application.add_event_handler("startup", _startup)
+        application.add_event_handler("shutdown", _shutdown)
+    return application
+
+
+# uvicorn main:app
+app = create_app()
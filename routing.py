@@ -0,0 +1,106 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+# Routing thresholds, shared by /chat and the offline evaluation (evaluate.py)
+KB_SCORE_THRESHOLD_RAW = 2.5  # Threshold in raw score (approximately corresponds to 0.25 in normalized)
+KB_SCORE_NORMALIZER = 10.0  # raw score usually from 0 to ~20-30, raw / normalizer → 0-1
+KB_SCORE_THRESHOLD = 0.2  # Relevance threshold for ticket creation control
+MAX_KB_SOURCES = 2
+FAST_PATH_MIN_SCORE = 0.6  # KB hit strong enough to be answered from KB alone (High confidence)
+
+
+def route_kb_results(
+    kb_results: List[Dict[str, Any]],
+    raw_threshold: float = KB_SCORE_THRESHOLD_RAW,
+    threshold: float = KB_SCORE_THRESHOLD,
+    normalizer: float = KB_SCORE_NORMALIZER,
+) -> Tuple[List[Dict[str, Any]], float, bool]:
+    """Filters KB results and decides ticket creation: (kb_results, top_score, can_create_ticket)"""
+    # Show only relevant sources and maximum 2 sources
+    kb_results = [x for x in kb_results if x.get("score", 0) >= raw_threshold][:MAX_KB_SOURCES]
+
+    # Determine top score for confidence from search_kb results
+    # Use score that already accounts for RU→EN translations and correct calculation logic
+    top_score = 0.0
+    if kb_results:
+        # Take score from first (best) result and normalize it to 0-1
+        top_score = min(kb_results[0].get("score", 0.0) / normalizer, 1.0)
+
+    # TICKET CREATION CONTROL: determine if model can create tickets
+    # If KB found and score is normal → disable tools (model cannot create ticket)
+    # If KB not found or low score → enable tools (model can call create_ticket)
+    can_create_ticket = not kb_results or top_score < threshold
+    return kb_results, top_score, can_create_ticket
+
+
+def is_fast_path_eligible(kb_results: List[Dict[str, Any]], top_score: float, can_create_ticket: bool) -> bool:
+    """Strong KB hit with tools disabled: the answer needs no tool loop"""
+    return bool(kb_results) and not can_create_ticket and top_score > FAST_PATH_MIN_SCORE
+
+
+def is_clarifying_question(text: str) -> bool:
+    """Determines if answer is a clarifying question"""
+    # Consider clarifying only if there are many questions or answer is mostly questions
+    q_count = text.count("?")
+    if q_count >= 2:
+        return True
+    
+    # If one question, but it takes up most of the answer
+    if q_count == 1:
+        # Check that question is not at the end of a short answer after providing information
+        text_lower = text.lower()
+        clarifying_patterns = [
+            r"to help (?:you|better|more|precisely)",
+            r"could you (?:please )?(?:clarify|specify|tell me|provide)",
+            r"which (?:one|method|way|option)",
+            r"what (?:error|message|method|happened|did you)",
+            r"are you (?:trying|using|getting)",
+            r"do you (?:have|see|use|get)",
+            r"please (?:clarify|specify|provide|tell)",
+            r"чтобы помочь",
+            r"уточните",
+            r"какой|какая|какое",
+        ]
+        
+        # If there are clarifying question patterns AND answer is short (< 50 words)
+        # then it's a clarifying question
+        for pattern in clarifying_patterns:
+            if re.search(pattern, text_lower):
+                if len(text.split()) < 50:
+                    return True
+        
+        # If answer is very short and mostly consists of a question
+        if len(text.split()) < 20:
+            return True
+    
+    return False
+
+
+def determine_confidence_from_score(
+    top_score: float,
+    sources: List[Dict],
+    all_tool_calls: List[tuple],
+    answer: str
+) -> str:
+    """Determines confidence based on retrieval score"""
+    
+    # If KB sources exist and score is normal — this is NOT Low, even if there's 1 question at the end
+    if sources and top_score >= 0.3:
+        if top_score > 0.6:
+            return "High"
+        return "Medium"
+    
+    # Further — only if no sources, then clarifications = Low
+    if is_clarifying_question(answer):
+        return "Low"
+    
+    # If ticket created and no sources - Low
+    if any(name == "create_ticket" for name, _, _ in all_tool_calls) and not sources:
+        return "Low"
+    
+    # If sources exist but low score - Medium
+    if sources:
+        return "Medium"
+    
+    # Default Low
+    return "Low"
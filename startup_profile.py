@@ -0,0 +1,66 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class StartupProfile:
+    """Where the time between main.py starting to import and the app being ready goes.
+
+    Steps are recorded as they finish (imports, config, app, db, kb_index, ...); the
+    breakdown is logged once when the app becomes ready and served by /readyz. A step
+    that raised is listed under failed_steps."""
+
+    def __init__(self, started: float) -> None:
+        self.started = started  # time.perf_counter() at the start of main.py's imports
+        self.steps: Dict[str, float] = {}  # step → ms, in the order they finished
+        self.failed: Dict[str, str] = {}  # step → "ErrorType: message"
+        self.ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.steps[name] = round(self.steps.get(name, 0.0) + seconds * 1000, 1)
+            if error is not None:
+                self.failed[name] = f"{type(error).__name__}: {error}"
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.record(name, time.perf_counter() - started, error=e)
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+        report = self.report()
+        failed = report.get("failed_steps", {})
+        steps = ", ".join(
+            f"{name} {ms:.0f}ms" + (" (failed)" if name in failed else "") for name, ms in report["steps_ms"].items()
+        )
+        print(f"🚀 Ready {report['total_ms']:.0f}ms after start ({steps})")
+
+    def mark_failed(self, error: str) -> None:
+        self.error = error
+        print(f"❌ Startup warm-up failed, not ready: {error}")
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = dict(self.steps)
+            failed = dict(self.failed)
+        report: Dict[str, Any] = {"ready": self.ready, "steps_ms": steps}
+        if failed:
+            report["failed_steps"] = failed
+        if self.ready_at is not None:
+            report["total_ms"] = round((self.ready_at - self.started) * 1000, 1)
+        if self.error:
+            report["error"] = self.error
+        return report
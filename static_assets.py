@@ -0,0 +1,110 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+STATIC_SOURCE_DIR = "static"
+STATIC_BUILD_DIR = "static_build"  # output of build_static.py
+MANIFEST_NAME = "manifest.json"
+# Fingerprinted URLs change whenever content does, so browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Everything else (index.html, unhashed names) is revalidated with ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Server preference when the client accepts several
+ENCODINGS = ["br", "gzip"]
+
+
+def load_manifest(build_dir: str = STATIC_BUILD_DIR) -> Optional[Dict[str, Any]]:
+    path = os.path.join(build_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings from an Accept-Encoding header that the client accepts (q > 0)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    return [e for e in ENCODINGS if accepted.get(e, wildcard) > 0]
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving build_static.py output: picks a .br/.gz variant by Accept-Encoding,
+    immutable caching for fingerprinted names, content-hash ETags and 304s.
+    Without a manifest (unbuilt static/) files are served as-is with revalidation."""
+
+    def __init__(self, directory: str, manifest: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(directory=directory)
+        # served path → manifest entry; the original name maps to the same files, so
+        # external links to /static/script.js keep working (revalidated, not immutable)
+        self._files: Dict[str, Dict[str, Any]] = {}
+        for entry in (manifest or {}).get("files", {}).values():
+            self._files[entry["path"]] = {**entry, "immutable": True}
+            self._files[entry["source"]] = {**entry, "immutable": False}
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        entry = self._files.get(path.replace(os.sep, "/"))
+        if entry is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("cache-control", REVALIDATE_CACHE_CONTROL)
+            return response
+
+        request_headers = Headers(scope=scope)
+        encoding = next(
+            (e for e in accepted_encodings(request_headers.get("accept-encoding", "")) if e in entry["encodings"]),
+            None,
+        )
+        file_path = entry["encodings"][encoding] if encoding else entry["path"]
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, file_path)
+        if stat_result is None:
+            return await super().get_response(path, scope)
+
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL if entry["immutable"] else REVALIDATE_CACHE_CONTROL,
+            # Each encoding is a different representation, so it gets its own ETag
+            "etag": f'"{entry["hash"]}{"-" + encoding if encoding else ""}"',
+        }
+        if entry["encodings"]:
+            headers["vary"] = "Accept-Encoding"
+        if encoding:
+            headers["content-encoding"] = encoding
+        response = FileResponse(
+            full_path, stat_result=stat_result, headers=headers, media_type=entry["content_type"]
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def make_static_files(
+    source_dir: str = STATIC_SOURCE_DIR, build_dir: str = STATIC_BUILD_DIR
+) -> PrecompressedStaticFiles:
+    """Serves the built assets if build_static.py has been run, otherwise static/ directly"""
+    manifest = load_manifest(build_dir)
+    if manifest is None:
+        print(f"ℹ️  No {build_dir}/{MANIFEST_NAME}, serving {source_dir}/ unbuilt (run: python build_static.py)")
+        return PrecompressedStaticFiles(source_dir)
+
+    built_at = manifest.get("built_at", 0)
+    for name in os.listdir(source_dir):
+        if os.path.getmtime(os.path.join(source_dir, name)) > built_at:
+            print(f"⚠️  {source_dir}/{name} changed after the last static build, run: python build_static.py")
+            break
+    return PrecompressedStaticFiles(build_dir, manifest=manifest)
@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+DEFAULT_TENANT_ID = "default"
+DEFAULT_KB_PATH = "kb_seed.json"
+# One directory per tenant: <KB_TENANTS_DIR>/<tenant_id>/kb.json and optional tenant.json
+DEFAULT_TENANTS_DIR = "kbs"
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Topics of the seed KB, worded as they've always been in the system prompt
+DEFAULT_TOPICS = [
+    "Password reset",
+    "Payment failures",
+    "API rate limits",
+    "Account deletion",
+    "Two-factor authentication",
+]
+DEFAULT_TOPICS_SUMMARY = "password reset, payment issues, rate limits, account deletion, 2FA"
+
+
+class UnknownTenantError(LookupError):
+    """No KB is configured for this tenant id"""
+
+
+@dataclass
+class Tenant:
+    tenant_id: str
+    kb_path: str
+    name: str = "product"
+    assistant: str = "a product support assistant"  # how the system prompt introduces the model
+    topics: List[str] = field(default_factory=list)
+    topics_summary: str = ""
+
+
+def _topics_from_kb(kb_path: str) -> List[str]:
+    # Without a tenant.json, every article title is an allowed topic
+    with open(kb_path, "r", encoding="utf-8") as f:
+        return [a["title"] for a in json.load(f) if a.get("title")]
+
+
+class TenantRegistry:
+    """Resolves tenant ids to their KB file and topic list; tenants are read from disk on first use"""
+
+    def __init__(self, tenants_dir: Optional[str] = None, default_kb_path: str = DEFAULT_KB_PATH) -> None:
+        # Read at construction, not import, so a .env loaded by the app is honored
+        self.tenants_dir = tenants_dir or os.getenv("KB_TENANTS_DIR", DEFAULT_TENANTS_DIR)
+        self._tenants: Dict[str, Tenant] = {
+            DEFAULT_TENANT_ID: Tenant(
+                DEFAULT_TENANT_ID,
+                default_kb_path,
+                topics=list(DEFAULT_TOPICS),
+                topics_summary=DEFAULT_TOPICS_SUMMARY,
+            )
+        }
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id: Optional[str] = None) -> Tenant:
+        tenant_id = (tenant_id or DEFAULT_TENANT_ID).strip().lower()
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            return tenant
+        # The id ends up in a file path, so only plain slugs are accepted
+        if not TENANT_ID_RE.match(tenant_id):
+            raise UnknownTenantError(f"Invalid tenant id: {tenant_id!r}")
+        with self._lock:
+            tenant = self._tenants.get(tenant_id) or self._load(tenant_id)
+            self._tenants[tenant_id] = tenant
+            return tenant
+
+    def _load(self, tenant_id: str) -> Tenant:
+        tenant_dir = os.path.join(self.tenants_dir, tenant_id)
+        kb_path = os.path.join(tenant_dir, "kb.json")
+        if not os.path.isfile(kb_path):
+            raise UnknownTenantError(f"Unknown tenant: {tenant_id}")
+
+        config: Dict[str, object] = {}
+        config_path = os.path.join(tenant_dir, "tenant.json")
+        if os.path.isfile(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        topics = list(config.get("topics") or _topics_from_kb(kb_path))
+        name = str(config.get("name") or tenant_id)
+        return Tenant(
+            tenant_id,
+            kb_path,
+            name=name,
+            assistant=str(config.get("assistant") or f"the {name} support assistant"),
+            topics=topics,
+            topics_summary=str(config.get("topics_summary") or ", ".join(t.lower() for t in topics)),
+        )
+
+    def tenant_ids(self) -> List[str]:
+        """Configured tenants (loaded or not)"""
+        ids = {DEFAULT_TENANT_ID}
+        if os.path.isdir(self.tenants_dir):
+            ids.update(
+                name
+                for name in os.listdir(self.tenants_dir)
+                if TENANT_ID_RE.match(name) and os.path.isfile(os.path.join(self.tenants_dir, name, "kb.json"))
+            )
+        return sorted(ids)
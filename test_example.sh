@@ -1,5 +1,7 @@
 #!/bin/bash
 # Пример тестового запроса к API
+# Для детерминированного офлайн-прогона без OpenAI: сначала запустите сервер с LLM_TRANSPORT=record,
+# затем с LLM_TRANSPORT=replay (ответы берутся из llm_store.db)
 
 curl -X POST http://127.0.0.1:8000/chat \
   -H "Content-Type: application/json" \
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules live at the repository root (no package), tests import them directly;
+# main.py resolves kb_seed.json and static/ relative to the working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
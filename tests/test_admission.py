@@ -0,0 +1,163 @@
+import threading
+import time
+
+import anyio
+import anyio.to_thread
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, size_threadpool
+
+
+def test_key_bucket_rejects_after_burst():
+    admission = AdmissionController(key_rate=0.01, key_burst=3)
+    for _ in range(3):
+        admission.admit(["thread:a"])
+    with pytest.raises(AdmissionRejected) as e:
+        admission.admit(["thread:a"])
+    assert e.value.retry_after > 0
+    admission.admit(["thread:b"])  # other keys are unaffected
+    assert admission.counters["rejected_key_rate"] == 1
+
+
+def test_rejected_admission_takes_no_tokens():
+    admission = AdmissionController(key_rate=0.01, key_burst=1)
+    admission.admit(["client:x"])
+    with pytest.raises(AdmissionRejected):
+        admission.admit(["thread:fresh", "client:x"])
+    admission.admit(["thread:fresh"])  # its token wasn't spent by the rejected call
+
+
+def test_global_bucket():
+    admission = AdmissionController(global_rate=0.01, global_burst=2)
+    admission.admit([])
+    admission.admit([])
+    with pytest.raises(AdmissionRejected):
+        admission.admit([])
+    assert admission.counters["rejected_global_rate"] == 1
+
+
+def hold_slots(admission: AdmissionController, count: int, seconds: float) -> threading.Event:
+    release = threading.Event()
+    entered = threading.Barrier(count + 1)
+
+    def hold():
+        with admission.upstream_slot():
+            entered.wait()
+            release.wait(seconds)
+
+    for _ in range(count):
+        threading.Thread(target=hold, daemon=True).start()
+    entered.wait()
+    return release
+
+
+def test_queue_full_is_rejected_fast():
+    admission = AdmissionController(max_in_flight=2, max_queue=0)
+    release = hold_slots(admission, 2, 5)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        with admission.upstream_slot():
+            pass
+    assert time.monotonic() - started < 0.5
+    assert admission.counters["rejected_queue_full"] == 1
+    release.set()
+
+
+def test_queued_request_times_out():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.2)
+    release = hold_slots(admission, 1, 5)
+    with pytest.raises(AdmissionRejected):
+        with admission.upstream_slot():
+            pass
+    assert admission.counters["rejected_queue_timeout"] == 1
+    release.set()
+
+
+def test_queued_request_gets_freed_slot():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release = hold_slots(admission, 1, 5)
+    threading.Timer(0.1, release.set).start()
+    with admission.upstream_slot():
+        assert admission.in_flight == 1
+
+
+def test_queue_fills_within_threadpool():
+    """70 concurrent sync requests against default limits: 16 run, 32 wait, the rest are rejected"""
+    admission = AdmissionController()
+    results = {"ok": 0, "rejected": 0}
+
+    def request():
+        try:
+            with admission.upstream_slot():
+                time.sleep(0.2)
+            results["ok"] += 1
+        except AdmissionRejected:
+            results["rejected"] += 1
+
+    async def run():
+        threads = size_threadpool(admission)
+        assert threads >= admission.max_in_flight + admission.max_queue
+        async with anyio.create_task_group() as tg:
+            for _ in range(70):
+                tg.start_soon(anyio.to_thread.run_sync, request)
+
+    anyio.run(run)
+    assert admission.peak_waiting == admission.max_queue
+    assert admission.counters["rejected_queue_full"] == 70 - admission.max_in_flight - admission.max_queue
+    assert results["ok"] == admission.max_in_flight + admission.max_queue
+
+
+def test_client_key_sources():
+    headers = {"x-forwarded-for": "6.6.6.6, 203.0.113.7", "x-client-id": "tenant-42"}
+    assert AdmissionController().client_key("10.0.0.1", headers) == "10.0.0.1"
+    forwarded = AdmissionController(client_key_source="forwarded")
+    assert forwarded.client_key("10.0.0.1", headers) == "203.0.113.7"  # spoofed left entry ignored
+    assert forwarded.client_key("10.0.0.1", {}) == "10.0.0.1"
+    two_proxies = AdmissionController(client_key_source="forwarded", trusted_proxies=2)
+    assert two_proxies.client_key("10.0.0.1", headers) == "6.6.6.6"
+    by_header = AdmissionController(client_key_source="header:x-client-id")
+    assert by_header.client_key("10.0.0.1", headers) == "tenant-42"
+    with pytest.raises(ValueError):
+        AdmissionController(client_key_source="cookie")
+
+
+def test_batch_items_leave_slots_for_interactive_requests():
+    controller = AdmissionController(max_in_flight=3, max_batch_in_flight=2, queue_timeout=0.2)
+    with controller.upstream_slot(batch=True), controller.upstream_slot(batch=True):
+        # Batch share used up: another item waits and times out, interactive requests still get in
+        with pytest.raises(AdmissionRejected):
+            with controller.upstream_slot(batch=True):
+                pass
+        with controller.upstream_slot():
+            assert controller.stats()["batch_in_flight"] == 2
+    assert controller.counters["rejected_batch_timeout"] == 1
+
+
+def test_queued_interactive_request_goes_before_batch_items():
+    controller = AdmissionController(max_in_flight=1, max_batch_in_flight=1, queue_timeout=2.0)
+    order = []
+    first = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with controller.upstream_slot():
+            first.set()
+            release.wait(2)
+
+    def acquire(name, batch):
+        with controller.upstream_slot(batch=batch):
+            order.append(name)
+
+    threads = [threading.Thread(target=hold)]
+    threads[0].start()
+    first.wait(2)
+    threads.append(threading.Thread(target=acquire, args=("batch", True)))
+    threads[-1].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=acquire, args=("interactive", False)))
+    threads[-1].start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(3)
+    assert order == ["interactive", "batch"]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "admission", AdmissionController())
+
+    def fake_answer(payload, kb_results=None, tenant=None, **kwargs):
+        return {"answer": f"echo: {payload.message}", "confidence": "High"}
+
+    monkeypatch.setattr(main, "answer_chat", fake_answer)
+    return TestClient(main.app)
+
+
+def batch_lines(response):
+    return sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"])
+
+
+def test_items_without_thread_id_dont_share_a_bucket(client):
+    items = [{"message": f"question {i}"} for i in range(30)]
+    response = client.post("/chat/batch", json={"items": items})
+    assert response.status_code == 200
+    lines = batch_lines(response)
+    assert len(lines) == 30
+    assert all("response" in line for line in lines), [line.get("error") for line in lines]
+
+
+def test_items_with_one_thread_id_are_limited_per_thread(client):
+    items = [{"message": f"question {i}", "thread_id": "same"} for i in range(15)]
+    lines = batch_lines(client.post("/chat/batch", json={"items": items}))
+    statuses = [line["error"]["status"] for line in lines if "error" in line]
+    assert statuses and set(statuses) == {429}
+    assert sum("response" in line for line in lines) == main.admission.key_burst
+
+
+def test_batch_is_charged_to_the_client(client):
+    for _ in range(main.admission.key_burst):
+        assert client.post("/chat/batch", json={"items": [{"message": "hi"}]}).status_code == 200
+    response = client.post("/chat/batch", json={"items": [{"message": "hi"}]})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_closed_batch_stream_stops_submitting_items():
+    import threading
+    import time
+
+    started = []
+    release = threading.Event()
+
+    def run_item(index):
+        started.append(index)
+        release.wait(2)
+        return {"index": index}
+
+    lines = main.run_batch(run_item, 500, concurrency=4)
+    release.set()
+    first = next(lines)
+    lines.close()  # client went away
+    time.sleep(0.2)
+    assert first["index"] < 4
+    assert len(started) <= 5  # the first 4, plus at most the one submitted after the first finished
+
+
+def test_batch_concurrency_is_capped_by_the_batch_share(client, monkeypatch):
+    seen = []
+    original = main.run_batch
+
+    def recording(run_item, count, concurrency):
+        seen.append(concurrency)
+        return original(run_item, count, concurrency)
+
+    monkeypatch.setattr(main, "run_batch", recording)
+    client.post("/chat/batch", json={"items": [{"message": "hi"}], "concurrency": 16})
+    assert seen == [main.admission.max_batch_in_flight]
+    assert main.admission.max_batch_in_flight < main.admission.max_in_flight
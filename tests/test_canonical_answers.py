@@ -0,0 +1,56 @@
+import threading
+import time
+
+import canonical_answers
+from canonical_answers import CanonicalAnswerStore
+
+
+def test_stale_entries_are_reloaded_by_one_caller(tmp_path, monkeypatch):
+    store = CanonicalAnswerStore(str(tmp_path / "runs.db"))
+    store.init()
+    reloads = []
+    reloading = threading.Event()
+    release = threading.Event()
+    original_reload = store.reload
+
+    def slow_reload():
+        reloads.append(threading.current_thread().name)
+        reloading.set()
+        release.wait(5)
+        original_reload()
+
+    monkeypatch.setattr(store, "reload", slow_reload)
+    monkeypatch.setattr(canonical_answers, "CANONICAL_REFRESH_SECONDS", 0.0)
+    store._loaded_at = time.monotonic() - 1
+    kb_results = [{"id": "pw_reset"}]
+
+    first = threading.Thread(target=store.lookup, args=("kb_seed.json", "reset password", kb_results))
+    first.start()
+    assert reloading.wait(5)
+    # Others don't block on the running reload and don't start their own
+    started = time.monotonic()
+    for _ in range(5):
+        assert store.lookup("kb_seed.json", "reset password", kb_results) is None
+    assert time.monotonic() - started < 1
+    release.set()
+    first.join(5)
+    assert len(reloads) == 1
+
+
+def test_stored_answer_is_served_only_in_its_language(tmp_path):
+    from kb_index import get_kb_index
+
+    store = CanonicalAnswerStore(str(tmp_path / "runs.db"))
+    store.init()
+    version = canonical_answers.article_version(get_kb_index("kb_seed.json").article("account_deletion"))
+    store._put("kb_seed.json", "account_deletion", "Удаление аккаунта", version, {"answer": "Чтобы удалить аккаунт..."})
+    store.reload()
+    kb_results = [{"id": "account_deletion"}]
+
+    # Both translate to {account, deletion}, but the stored answer is in Russian
+    assert store.lookup("kb_seed.json", "Account deletion", kb_results) is None
+    assert store.lookup("kb_seed.json", "удаление аккаунта", kb_results)["answer"].startswith("Чтобы")
+
+    store._put("kb_seed.json", "account_deletion", "Account deletion", version, {"answer": "To delete your account..."})
+    store.reload()
+    assert store.lookup("kb_seed.json", "account deletion", kb_results)["answer"].startswith("To delete")
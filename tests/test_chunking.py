@@ -0,0 +1,129 @@
+import json
+import re
+
+import pytest
+
+from kb_index import PASSAGE_MAX_CHARS, PASSAGE_OVERLAP_CHARS, KBIndex, chunk_article, normalize_query
+
+
+def make_article(content, article_id="a1", title="Some title"):
+    return {"id": article_id, "title": title, "content": content, "url": f"/{article_id}"}
+
+
+def article_level_score(article, query_words):
+    """Scoring of the article-level search that passages replaced"""
+    text = (article["title"] + " " + article["content"]).lower()
+    score = 0
+    matched_words = 0
+    for word in query_words:
+        matches = len(re.findall(r"\b" + re.escape(word) + r"\b", text))
+        if matches > 0:
+            score += matches * 2
+            matched_words += 1
+        elif word in text:
+            score += 1
+    title_lower = article["title"].lower()
+    for word in query_words:
+        if word in title_lower:
+            score += 3
+    if score <= 0:
+        return None
+    return score * (1 + matched_words / len(query_words))
+
+
+def test_long_article_is_split_into_overlapping_passages():
+    words = [f"word{i:04d}" for i in range(500)]
+    content = " ".join(words)
+    passages = chunk_article(make_article(content))
+
+    assert len(passages) > 1
+    assert [p["passage_id"] for p in passages] == [f"a1#{n}" for n in range(len(passages))]
+    for p in passages:
+        assert p["article_id"] == "a1"
+        assert len(p["text"]) <= PASSAGE_MAX_CHARS
+        assert content[p["start"]:p["start"] + len(p["text"])] == p["text"]
+        # Never cuts a word in half
+        assert set(p["text"].split()) <= set(words)
+
+    for prev, cur in zip(passages, passages[1:]):
+        prev_end = prev["start"] + len(prev["text"])
+        # Each passage moves forward and overlaps the previous one by at most overlap_chars
+        assert prev["start"] < cur["start"] <= prev_end
+        assert prev_end - cur["start"] <= PASSAGE_OVERLAP_CHARS
+
+    assert passages[0]["start"] == 0
+    assert passages[-1]["start"] + len(passages[-1]["text"]) == len(content)
+
+
+def test_chunking_is_stable():
+    content = " ".join(f"w{i}" for i in range(400))
+    assert chunk_article(make_article(content)) == chunk_article(make_article(content))
+
+
+def test_word_longer_than_max_chars_is_its_own_passage():
+    long_word = "x" * (PASSAGE_MAX_CHARS + 50)
+    content = f"before {long_word} after"
+    passages = chunk_article(make_article(content))
+
+    texts = [p["text"] for p in passages]
+    assert long_word in texts
+    assert all(long_word not in t or t == long_word for t in texts)
+    assert texts[0].startswith("before")
+    assert texts[-1].endswith("after")
+    assert [p["passage_id"] for p in passages] == [f"a1#{n}" for n in range(len(passages))]
+
+
+@pytest.mark.parametrize("content", ["", "   \n\t "])
+def test_empty_content_keeps_one_passage(content):
+    article = make_article(content, title="Password reset")
+    assert chunk_article(article) == [{"passage_id": "a1#0", "article_id": "a1", "start": 0, "text": ""}]
+
+    results = KBIndex([article]).search(normalize_query("password"))
+    assert [r["id"] for r in results] == ["a1"]
+    assert results[0]["snippet"] == ""
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "how do I reset my password",
+        "payment failed",
+        "api rate limit",
+        "delete account",
+        "2fa codes",
+        "пароль",
+        "xyzzy",
+    ],
+)
+def test_single_passage_scores_match_article_level_scores(query):
+    articles = json.load(open("kb_seed.json", encoding="utf-8"))
+    assert all(len(chunk_article(a)) == 1 for a in articles)
+
+    words = normalize_query(query)
+    expected = {}
+    for article in articles:
+        score = article_level_score(article, words)
+        if score is not None:
+            expected[article["id"]] = score
+
+    results = KBIndex(articles).search(words, limit=len(articles))
+    assert {r["id"]: r["score"] for r in results} == pytest.approx(expected)
+    for r in results:
+        assert r["snippet"] == next(a["content"] for a in articles if a["id"] == r["id"])
+
+
+def test_overlapping_passages_merge_into_one_snippet():
+    content = " ".join(["alpha"] * 60 + ["omega"] * 60 + ["alpha"] * 60)
+    article = make_article(content)
+    index = KBIndex([article])
+    assert index.passage_count() > 2
+
+    # Adjacent passages overlap, so they merge into one contiguous span
+    merged = index._merge_passages(article, [1, 0])
+    end = index.passage(1)["start"] + len(index.passage(1)["text"])
+    assert merged == content[:end]
+
+    # Passages that don't touch are joined with a separator, in document order
+    last = index.passage_count() - 1
+    disjoint = index._merge_passages(article, [last, 0])
+    assert disjoint == index.passage(0)["text"] + " … " + index.passage(last)["text"]
@@ -0,0 +1,51 @@
+import sqlite3
+
+from evaluate import load_questions_from_db
+
+
+def make_runs(path, with_run_id=True):
+    conn = sqlite3.connect(path)
+    run_id_column = ", run_id TEXT" if with_run_id else ""
+    conn.execute(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id TEXT, user_message TEXT, tool_name TEXT, "
+        f"tool_args TEXT, tool_result TEXT, final_answer TEXT, created_at REAL{run_id_column})"
+    )
+    return conn
+
+
+def test_repeated_identical_chats_are_separate_questions(tmp_path):
+    path = str(tmp_path / "runs.db")
+    conn = make_runs(path)
+    rows = [
+        ("r1", "search_kb"), ("r2", "search_kb"),  # same precomputed answer twice on demo-thread
+        ("r3", "search_kb"), ("r3", "create_ticket"),
+    ]
+    conn.executemany(
+        "INSERT INTO runs (thread_id, user_message, tool_name, final_answer, run_id) VALUES (?, ?, ?, ?, ?)",
+        [("demo-thread", "reset password", tool, "Same answer", run_id) for run_id, tool in rows],
+    )
+    conn.execute(
+        "INSERT INTO runs (thread_id, user_message, tool_name, final_answer) VALUES ('t', 'from /create-ticket', "
+        "'create_ticket', 'Ticket TCK-1 queued')"
+    )
+    conn.commit()
+    conn.close()
+
+    questions = load_questions_from_db(path)
+    assert len(questions) == 3
+    assert [q["created_ticket"] for q in questions] == [False, False, True]
+
+
+def test_rows_logged_before_run_id_are_grouped_per_call(tmp_path):
+    path = str(tmp_path / "runs.db")
+    conn = make_runs(path, with_run_id=False)
+    tools = ["search_kb", "search_kb", "create_ticket", "search_kb"]
+    conn.executemany(
+        "INSERT INTO runs (thread_id, user_message, tool_name, final_answer) VALUES (?, ?, ?, ?)",
+        [("demo-thread", "payment failed", tool, "Same answer") for tool in tools],
+    )
+    conn.commit()
+    conn.close()
+
+    questions = load_questions_from_db(path)
+    assert [q["created_ticket"] for q in questions] == [False, True, False]
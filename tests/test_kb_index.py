@@ -0,0 +1,93 @@
+import json
+import random
+
+import pytest
+
+from kb_index import BaseKBIndex, KBIndex, TermTrigramIndex, normalize_query
+from kb_snapshot import SnapshotIndex, compile_snapshot, load_snapshot
+
+WORDS = [
+    "password", "reset", "google", "payment", "invoice", "failed", "gateway", "limit", "token",
+    "account", "delete", "backup", "codes", "authenticator", "sms", "billing", "refund", "export",
+]
+
+
+@pytest.fixture
+def kb_path(tmp_path):
+    rng = random.Random(7)
+    articles = json.load(open("kb_seed.json", encoding="utf-8"))
+    for i in range(60):
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 300)))
+        articles.append({"id": f"a{i}", "title": f"Article {i} {rng.choice(WORDS)}", "content": content, "url": f"/a{i}"})
+    path = tmp_path / "kb.json"
+    path.write_text(json.dumps(articles), encoding="utf-8")
+    return str(path)
+
+
+def test_snapshot_matches_in_memory_index(kb_path, tmp_path):
+    with open(kb_path, encoding="utf-8") as f:
+        memory = KBIndex(json.load(f))
+    snapshot_path = str(tmp_path / "kb.kbsnap")
+    compile_snapshot(kb_path, snapshot_path)
+    snapshot = SnapshotIndex(snapshot_path)
+
+    assert sorted(snapshot.terms()) == sorted(memory.terms())
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(WORDS, 3)) for _ in range(100)]
+    queries += ["how do I reset my pasword", "paymnt failed again", "api rate limit", "xyzzy"]
+    for query in queries:
+        words = normalize_query(query)
+        assert snapshot.search(words, limit=5) == memory.search(words, limit=5), query
+
+
+def test_snapshot_trigrams_match_in_memory_index(kb_path, tmp_path):
+    with open(kb_path, encoding="utf-8") as f:
+        memory = KBIndex(json.load(f))
+    snapshot_path = str(tmp_path / "kb.kbsnap")
+    compile_snapshot(kb_path, snapshot_path)
+    snapshot = SnapshotIndex(snapshot_path)
+
+    mapped, built = snapshot.term_trigrams(), memory.term_trigrams()
+    assert isinstance(built, TermTrigramIndex)
+    assert not isinstance(mapped, TermTrigramIndex)
+    for word in ["pa", "pay", "word", "auth", "ment", "xyz", "платеж"]:
+        assert sorted(mapped.containing(word)) == sorted(built.containing(word)), word
+    for word in ["pasword", "paymnt", "authentcator", "invoise", "qqqqqq"]:
+        assert mapped.closest(word, 2) == built.closest(word, 2), word
+    # The in-memory trigram index is built with the index and counted in its budget
+    assert memory.memory_bytes() > built.memory_bytes() > 0
+
+
+def test_stale_snapshot_is_rejected(kb_path):
+    from kb_snapshot import SnapshotError, snapshot_path_for
+
+    compile_snapshot(kb_path, snapshot_path_for(kb_path))
+    assert isinstance(load_snapshot(kb_path), SnapshotIndex)
+    with open(kb_path, "a", encoding="utf-8") as f:
+        f.write(" ")
+    with pytest.raises(SnapshotError):
+        load_snapshot(kb_path)
+
+
+def test_incomplete_index_fails_at_construction():
+    class Incomplete(BaseKBIndex):
+        def terms(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("size", [0, 10, 100, -1])
+def test_empty_or_truncated_snapshot_falls_back_to_json(kb_path, size):
+    import os
+
+    import kb_index
+    from kb_snapshot import SnapshotError, snapshot_path_for
+
+    path = compile_snapshot(kb_path, snapshot_path_for(kb_path))
+    with open(path, "r+b") as f:
+        f.truncate(size if size >= 0 else os.path.getsize(path) - 1)
+    with pytest.raises(SnapshotError):
+        load_snapshot(kb_path)
+    assert isinstance(kb_index._load_index(kb_path), KBIndex)
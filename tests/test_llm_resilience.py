@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import llm_resilience
+from llm_resilience import CircuitBreaker, CircuitOpenError, ResilientCompletions
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_BACKOFF_BASE", 0.0)
+
+
+class FakeCreate:
+    """chat.completions.create stand-in: pops one behaviour per call"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.timeouts.append(timeout)
+            behaviour = self.behaviours.pop(0) if self.behaviours else "ok"
+        if isinstance(behaviour, BaseException):
+            raise behaviour
+        if isinstance(behaviour, (int, float)):
+            time.sleep(behaviour)
+            return f"slept {behaviour}"
+        return behaviour
+
+
+def test_retryable_errors_are_retried():
+    create = FakeCreate(TimeoutError("slow"), "ok")
+    assert ResilientCompletions(create).create(model="m") == "ok"
+    assert create.calls == 2
+
+
+def test_non_retryable_errors_are_raised_once_and_dont_open_breaker():
+    create = FakeCreate(ValueError("bad request"))
+    llm = ResilientCompletions(create, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(ValueError):
+        llm.create(model="m")
+    assert create.calls == 1
+    assert llm.breaker.state == "closed"
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    create = FakeCreate(*[TimeoutError("down")] * 4)
+    llm = ResilientCompletions(create, max_attempts=2, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0.2))
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            llm.create(model="m")
+    assert llm.breaker.state == "open"
+    calls = create.calls
+    with pytest.raises(CircuitOpenError):
+        llm.create(model="m")
+    assert create.calls == calls  # upstream not called while open
+
+    time.sleep(0.25)
+    assert llm.create(model="m") == "ok"  # half-open trial call succeeds
+    assert llm.breaker.state == "closed"
+
+
+def test_hung_attempt_is_capped_by_attempt_timeout():
+    create = FakeCreate(2.0, "ok")
+    llm = ResilientCompletions(create, deadline=5.0, attempt_timeout=0.2)
+    started = time.monotonic()
+    assert llm.create(model="m") == "ok"
+    assert time.monotonic() - started < 1.0
+    assert create.timeouts[0] == pytest.approx(0.2, abs=0.05)
+
+
+def test_slow_call_is_hedged():
+    llm = ResilientCompletions(FakeCreate(), hedge=True)
+    for _ in range(llm_resilience.HEDGE_MIN_SAMPLES):
+        llm.latency.add(0.01)
+    llm.create_fn = FakeCreate(3.0, "hedged")
+    started = time.monotonic()
+    assert llm.create(model="m") == "hedged"
+    # Hedge goes out after HEDGE_MIN_DELAY instead of waiting for the slow call
+    assert time.monotonic() - started < llm_resilience.HEDGE_MIN_DELAY + 1.0
+    assert llm.create_fn.calls == 2
+
+
+def test_openai_client_does_not_retry(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    import main
+
+    create = main._openai_completions()
+    assert create.__self__._client.max_retries == 0
@@ -0,0 +1,53 @@
+import inspect
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from startup_profile import StartupProfile
+
+
+def test_failed_step_is_recorded_as_failure():
+    profile = StartupProfile(time.perf_counter())
+    with profile.step("db"):
+        pass
+    with pytest.raises(RuntimeError):
+        with profile.step("llm_client"):
+            raise RuntimeError("no API key")
+    report = profile.report()
+    assert set(report["steps_ms"]) == {"db", "llm_client"}
+    assert report["failed_steps"] == {"llm_client": "RuntimeError: no API key"}
+
+
+def test_llm_client_warm_up_failure_shows_in_readyz(monkeypatch):
+    class BrokenTransport:
+        def warm_up(self):
+            raise RuntimeError("The api_key client option must be set")
+
+    monkeypatch.setattr(main, "startup_profile", StartupProfile(time.perf_counter()))
+    monkeypatch.setattr(main, "transport", BrokenTransport())
+    client = TestClient(main.app)
+    assert client.get("/readyz").status_code == 503
+
+    main._warm_up()
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert "kb_index" not in response.json().get("failed_steps", {})
+    assert response.json()["failed_steps"]["llm_client"].startswith("RuntimeError")
+
+
+def test_probes_dont_use_the_threadpool():
+    # Sync handlers would wait for a worker thread behind every queued /chat
+    assert inspect.iscoroutinefunction(main.healthz)
+    assert inspect.iscoroutinefunction(main.readyz)
+    assert TestClient(main.app).get("/healthz").json() == {"status": "ok"}
+
+
+def test_openai_is_not_imported_with_the_app():
+    import subprocess
+    import sys
+
+    code = "import sys, main; print('openai' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "False"
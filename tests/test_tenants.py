@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+import kb_index
+from tenants import TenantRegistry, UnknownTenantError
+
+
+def test_tenants_dir_is_read_at_construction(tmp_path, monkeypatch):
+    tenant_dir = tmp_path / "acme"
+    tenant_dir.mkdir()
+    (tenant_dir / "kb.json").write_text(
+        json.dumps([{"id": "a", "title": "Widgets", "content": "Widget setup", "url": "/a"}]), encoding="utf-8"
+    )
+    monkeypatch.setenv("KB_TENANTS_DIR", str(tmp_path))  # e.g. set by load_dotenv() after import
+    registry = TenantRegistry(default_kb_path="kb_seed.json")
+    assert set(registry.tenant_ids()) == {"acme", "default"}
+    assert registry.get("acme").topics == ["Widgets"]
+    assert registry.get(None).kb_path == "kb_seed.json"
+    with pytest.raises(UnknownTenantError):
+        registry.get("missing")
+
+
+def test_index_memory_budget_is_read_when_configured(monkeypatch):
+    monkeypatch.setenv("KB_INDEX_MEMORY_MB", "8")
+    try:
+        assert kb_index.configure_kb_index_cache() == 8 * 1024 * 1024
+        assert kb_index.kb_index_cache_stats()["budget_bytes"] == 8 * 1024 * 1024
+    finally:
+        monkeypatch.delenv("KB_INDEX_MEMORY_MB")
+        kb_index.configure_kb_index_cache()
@@ -0,0 +1,228 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+import tickets
+from ticket_dedup import TicketSimilarityIndex
+from tickets import LocalTrackerAdapter, OutboxDispatcher, TicketStore, TrackerAdapter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "runs.db")
+    TicketStore(path).init()
+    return path
+
+
+class CountingAdapter(TrackerAdapter):
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.deliveries: List[str] = []
+        self._lock = threading.Lock()
+
+    def deliver(self, batch: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        if self.fail:
+            raise ConnectionError("tracker down")
+        with self._lock:
+            self.deliveries.extend(t["ticket_id"] for t in batch)
+        return {t["ticket_id"]: f"EXT-{t['ticket_id']}" for t in batch}
+
+
+def test_enqueue_is_idempotent(db_path):
+    store = TicketStore(db_path)
+    first = store.enqueue("Login broken", "Cannot log in", "P2")
+    again = store.enqueue("login broken ", "cannot  log in", "P2")
+    assert first["created"] and not again["created"]
+    assert first["ticket_id"] == again["ticket_id"]
+
+
+def test_dispatcher_delivers_and_marks_ticket(db_path):
+    store = TicketStore(db_path)
+    ticket = store.enqueue("Login broken", "Cannot log in")
+    adapter = CountingAdapter()
+    assert OutboxDispatcher(store, adapter).dispatch_once() == 1
+    assert adapter.deliveries == [ticket["ticket_id"]]
+    stored = store.get(ticket["ticket_id"])
+    assert stored["status"] == "delivered"
+    assert stored["external_id"] == f"EXT-{ticket['ticket_id']}"
+    # Nothing left to deliver
+    assert OutboxDispatcher(store, adapter).dispatch_once() == 0
+
+
+def test_claimed_entries_are_hidden_from_other_workers(db_path):
+    worker_a, worker_b = TicketStore(db_path), TicketStore(db_path)
+    for i in range(5):
+        worker_a.enqueue(f"Ticket {i}", f"Description {i}")
+    claimed = worker_a.claim_batch()
+    assert len(claimed) == 5
+    assert worker_b.claim_batch() == []
+
+
+def test_expired_lease_is_claimed_again(db_path):
+    store = TicketStore(db_path)
+    store.enqueue("Login broken", "Cannot log in")
+    assert len(store.claim_batch(lease=0)) == 1  # claiming worker "died", lease already over
+    assert len(store.claim_batch()) == 1
+
+
+def test_concurrent_dispatchers_deliver_each_ticket_once(db_path):
+    store = TicketStore(db_path)
+    ids = {store.enqueue(f"Ticket {i}", f"Description {i}")["ticket_id"] for i in range(40)}
+    adapter = CountingAdapter()
+    # One dispatcher per "worker process", each with its own store object, small batches
+    dispatchers = [OutboxDispatcher(TicketStore(db_path), adapter, batch_size=3) for _ in range(4)]
+
+    def drain(dispatcher: OutboxDispatcher) -> None:
+        while dispatcher.dispatch_once():
+            pass
+
+    threads = [threading.Thread(target=drain, args=(d,)) for d in dispatchers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(adapter.deliveries) == sorted(ids)
+
+
+def test_failed_delivery_is_retried_with_backoff(db_path):
+    store = TicketStore(db_path)
+    ticket = store.enqueue("Login broken", "Cannot log in")
+    failing = CountingAdapter(fail=True)
+    assert OutboxDispatcher(store, failing).dispatch_once() == 1
+    # Backoff: not due yet
+    assert store.claim_batch() == []
+    assert store.get(ticket["ticket_id"])["status"] == "queued"
+
+
+def test_dead_letter_after_max_attempts(db_path, monkeypatch):
+    monkeypatch.setattr(tickets, "OUTBOX_BACKOFF_BASE", 0.0)
+    store = TicketStore(db_path)
+    ticket = store.enqueue("Login broken", "Cannot log in")
+    failing = CountingAdapter(fail=True)
+    for _ in range(tickets.OUTBOX_MAX_ATTEMPTS):
+        assert OutboxDispatcher(store, failing).dispatch_once() == 1
+    assert OutboxDispatcher(store, failing).dispatch_once() == 0
+    assert store.get(ticket["ticket_id"])["status"] == "delivery_failed"
+
+
+def test_local_adapter_and_incomplete_adapter():
+    adapter = LocalTrackerAdapter()
+    assert adapter.deliver([{"ticket_id": "TCK-1"}]) == {"TCK-1": "LOCAL-TCK-1"}
+
+    class Incomplete(TrackerAdapter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_near_duplicate_is_attached_and_ticket_is_json_serializable(db_path):
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    first = store.enqueue("Payment failed", "Card payment failed on invoice 1234 with error 402", "P2")
+    second = store.enqueue("Payment failed again", "Card payment failed on invoice 1234 with error 402 again", "P1")
+    assert second["attached"] and second["ticket_id"] == first["ticket_id"]
+
+    ticket = store.get(first["ticket_id"])
+    assert "minhash" not in ticket
+    assert ticket["duplicate_count"] == 1
+    assert ticket["priority"] == "P1"  # escalated by the repeated report
+    json.dumps(ticket)
+
+
+def test_get_ticket_endpoint_after_dedup(db_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    monkeypatch.setattr(main, "ticket_store", store)
+    ticket = store.enqueue("Login broken", "Cannot log in with Google since yesterday")
+
+    response = TestClient(main.app).get(f"/tickets/{ticket['ticket_id']}")
+    assert response.status_code == 200
+    assert response.json()["ticket_id"] == ticket["ticket_id"]
+
+
+def test_reports_differing_in_identifiers_are_not_merged(db_path):
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    alice = store.enqueue("Account deletion request", "Please delete account alice@example.com")
+    bob = store.enqueue("Account deletion request", "Please delete account bob@example.com")
+    assert bob["created"] and bob["ticket_id"] != alice["ticket_id"]
+    invoice = store.enqueue("Refund request", "Refund invoice INV-1001 charged twice")
+    other = store.enqueue("Refund request", "Refund invoice INV-2002 charged twice")
+    assert other["created"] and other["ticket_id"] != invoice["ticket_id"]
+
+
+def test_attached_report_is_forwarded_to_the_tracker(db_path):
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    first = store.enqueue("Payment failed", "Card payment failed on invoice 1234 with error 402")
+    second = store.enqueue("Payment failed again", "Card payment failed on invoice 1234 with error 402 again", "P1")
+    assert second["attached"]
+
+    class RecordingAdapter(TrackerAdapter):
+        def __init__(self) -> None:
+            self.items: List[Dict[str, Any]] = []
+
+        def deliver(self, batch: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+            self.items.extend(batch)
+            return {t["ticket_id"]: f"EXT-{t['ticket_id']}" for t in batch if "duplicate_report_id" not in t}
+
+    adapter = RecordingAdapter()
+    dispatcher = OutboxDispatcher(store, adapter)
+    # The report waits for its ticket, then goes out linked to the ticket's external id
+    assert dispatcher.dispatch_once() == 1
+    assert dispatcher.dispatch_once() == 1
+    assert dispatcher.dispatch_once() == 0
+    ticket_item, report_item = adapter.items
+    assert "duplicate_report_id" not in ticket_item
+    assert report_item["ticket_id"] == first["ticket_id"]
+    assert report_item["external_id"] == f"EXT-{first['ticket_id']}"
+    assert report_item["title"] == "Payment failed again" and report_item["priority"] == "P1"
+    assert store.get(first["ticket_id"])["status"] == "delivered"
+
+
+def test_duplicates_are_matched_across_workers(db_path):
+    worker_a = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    worker_b = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    worker_a.load()
+    worker_b.load()
+    first = worker_a.enqueue("Export broken", "CSV export of reports times out for the whole team")
+    second = worker_b.enqueue("Export broken", "CSV export of reports times out for our whole team")
+    assert second.get("attached") and second["ticket_id"] == first["ticket_id"]
+
+
+def test_signatures_of_an_older_version_are_recomputed(db_path):
+    import sqlite3
+
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    first = store.enqueue("Export broken", "CSV export of reports times out for the whole team")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE tickets SET minhash = zeroblob(256), minhash_version = NULL")
+    conn.close()
+
+    restarted = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    restarted.load()
+    second = restarted.enqueue("Export broken", "CSV export of reports times out for our whole team")
+    assert second.get("attached") and second["ticket_id"] == first["ticket_id"]
+
+
+def test_tickets_are_scoped_per_tenant(db_path):
+    store = TicketStore(db_path, dedup=TicketSimilarityIndex())
+    store.load()
+    a = store.enqueue("Export broken", "CSV export times out", tenant_id="acme")
+    b = store.enqueue("Export broken", "CSV export times out", tenant_id="globex")
+    assert a["created"] and b["created"] and a["ticket_id"] != b["ticket_id"]
+    # Near-duplicates only attach within the tenant
+    similar = store.enqueue("Export broken", "CSV export times out again today", tenant_id="globex")
+    assert similar.get("attached") and similar["ticket_id"] == b["ticket_id"]
+    assert store.get(b["ticket_id"])["tenant_id"] == "globex"
+    # Default-tenant keys are the same as before tenants existed
+    assert tickets.idempotency_key("t", "d", "P2") == tickets.idempotency_key("t", "d", "P2", "default")
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+
+from tools import ToolCall, ToolExecutor, ToolRegistry
+
+
+def make_executor(max_workers: int = 8, queue_timeout: float = 10.0) -> ToolExecutor:
+    registry = ToolRegistry()
+    registry.register("add", lambda a, b: a + b, timeout=1.0)
+    registry.register("sleep", lambda seconds: time.sleep(seconds) or "slept", timeout=0.3)
+
+    def broken(x):
+        return len(x) + "oops"  # TypeError from the tool body, not from its arguments
+
+    registry.register("broken", broken)
+    return ToolExecutor(registry, max_workers=max_workers, queue_timeout=queue_timeout)
+
+
+def test_results_in_call_order():
+    outcomes = make_executor().run(
+        [ToolCall("1", "add", '{"a": 1, "b": 2}'), ToolCall("2", "add", '{"a": 3, "b": 4}')]
+    )
+    assert [o.result for o in outcomes] == [3, 7]
+    assert all(o.ok for o in outcomes)
+
+
+def test_binding_errors_are_invalid_arguments():
+    [outcome] = make_executor().run([ToolCall("1", "add", '{"a": 1}')])
+    assert not outcome.ok
+    assert outcome.result["error"]["type"] == "invalid_arguments"
+
+
+def test_type_error_inside_tool_is_tool_failure():
+    [outcome] = make_executor().run([ToolCall("1", "broken", '{"x": "abc"}')])
+    assert outcome.result["error"]["type"] == "tool_failed"
+    assert "TypeError" in outcome.result["error"]["message"]
+
+
+def test_invalid_json_and_unknown_tool():
+    outcomes = make_executor().run([ToolCall("1", "add", "{not json"), ToolCall("2", "nope", "{}")])
+    assert [o.result["error"]["type"] for o in outcomes] == ["invalid_call", "invalid_call"]
+
+
+def test_slow_tool_times_out():
+    [outcome] = make_executor().run([ToolCall("1", "sleep", '{"seconds": 2}')])
+    assert outcome.result["error"]["type"] == "timeout"
+    assert outcome.duration_ms < 1000
+
+
+def test_waiting_for_a_busy_pool_is_not_a_timeout():
+    executor = make_executor(max_workers=1)
+    release = threading.Event()
+    # Occupies the only pool thread for longer than the "sleep" tool's timeout
+    blocker = executor._pool.submit(release.wait, 5)
+    threading.Timer(0.5, release.set).start()
+
+    [outcome] = executor.run([ToolCall("1", "sleep", '{"seconds": 0.1}')])
+    blocker.result()
+    assert outcome.ok, outcome.result
+    assert outcome.result == "slept"
+
+
+def test_queued_call_gives_up_when_hung_tools_hold_every_thread():
+    executor = make_executor(max_workers=1, queue_timeout=0.3)
+    release = threading.Event()
+    hung = executor._pool.submit(release.wait, 5)  # a timed-out tool still holding the thread
+
+    started = time.perf_counter()
+    [outcome] = executor.run([ToolCall("1", "add", '{"a": 1, "b": 2}')])
+    assert time.perf_counter() - started < 1.0
+    assert outcome.result["error"]["type"] == "timeout"
+    assert "did not start" in outcome.result["error"]["message"]
+    release.set()
+    hung.result()
+
+
+def test_context_arguments_override_the_model():
+    registry = ToolRegistry()
+    registry.register("create", lambda title, tenant_id="default": {"title": title, "tenant_id": tenant_id})
+    registry.register("echo", lambda text: text)
+    executor = ToolExecutor(registry)
+    calls = [
+        ToolCall("1", "create", json.dumps({"title": "x", "tenant_id": "other"})),
+        ToolCall("2", "echo", json.dumps({"text": "hi"})),  # doesn't take tenant_id
+    ]
+    create, echo = executor.run(calls, context={"tenant_id": "acme"})
+    assert create.result == {"title": "x", "tenant_id": "acme"}
+    assert echo.ok and echo.result == "hi"
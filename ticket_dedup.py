@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# 64 MinHash values in 16 bands of 4 rows: pairs with Jaccard ≳ 0.5 share a bucket with high probability
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+DUPLICATE_THRESHOLD = 0.6  # estimated Jaccard similarity (over words) to treat tickets as duplicates
+DEDUP_WINDOW_SECONDS = 7 * 24 * 3600  # only recent tickets are considered
+SHINGLE_TEXT_LIMIT = 500  # chars; bounds signature cost for long descriptions
+# Bumped whenever shingles() changes: stored signatures of another version are recomputed
+SIGNATURE_VERSION = 2
+
+MAX_CANDIDATES = 32  # candidates verified per lookup, ranked by number of shared LSH bands
+
+_MASK64 = (1 << 64) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed constants: signatures must be identical across workers and restarts
+_HASH_MUL = 0x9E3779B97F4A7C15
+_FILL_OFFSET = 0x5BD1E995
+
+# Filler words that differ between reports of the same problem
+STOPWORDS = {
+    "the", "and", "for", "with", "again", "still", "not", "but", "this", "that", "are", "was",
+    "has", "have", "from", "when", "after", "user", "users", "please", "help", "issue", "problem",
+}
+
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+WORD_RE = re.compile(r"\w+")
+
+
+def identifiers(text: str) -> FrozenSet[str]:
+    """Emails and tokens with digits (invoice/order numbers, phone numbers, error codes).
+
+    Two reports that differ only in these are about different accounts or orders, so they
+    are kept out of similarity and must be equal for tickets to be duplicates."""
+    text = text.lower()
+    ids = set(EMAIL_RE.findall(text))
+    ids.update(w for w in WORD_RE.findall(EMAIL_RE.sub(" ", text)) if any(c.isdigit() for c in w))
+    return frozenset(ids)
+
+
+def shingles(text: str) -> Set[int]:
+    """Normalized words without identifiers and filler, hashed to 32 bits"""
+    text = EMAIL_RE.sub(" ", text.lower()[:SHINGLE_TEXT_LIMIT])
+    return {
+        zlib.crc32(w.encode("utf-8"))
+        for w in WORD_RE.findall(text)
+        if w not in STOPWORDS and not any(c.isdigit() for c in w)
+    }
+
+
+def minhash(text: str) -> Optional[array]:
+    """MinHash signature of text; None if there is nothing to compare
+
+    Uses one-permutation hashing: every shingle is hashed once and goes to one of NUM_PERM
+    bins, each bin keeps its minimum. This costs O(shingles) instead of O(shingles × NUM_PERM).
+    """
+    grams = shingles(text)
+    if not grams:
+        return None
+    bins = [-1] * NUM_PERM
+    for x in grams:
+        h = (x * _HASH_MUL) & _MASK64
+        b = h >> 58  # top 6 bits select the bin (NUM_PERM = 64)
+        v = h & _MAX_HASH
+        if bins[b] < 0 or v < bins[b]:
+            bins[b] = v
+    # Densification: empty bins borrow the value of the next non-empty bin, shifted by
+    # the distance, so short texts still produce comparable signatures
+    for b in range(NUM_PERM):
+        if bins[b] < 0:
+            step = 1
+            while bins[(b + step) % NUM_PERM] < 0:
+                step += 1
+            bins[b] = (bins[(b + step) % NUM_PERM] + step * _FILL_OFFSET) & _MAX_HASH
+    return array("I", bins)
+
+
+def estimated_jaccard(sig_a: array, sig_b: array) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class TicketSimilarityIndex:
+    """In-memory MinHash/LSH index over recent open tickets; tickets only match within their scope (tenant)"""
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD, window_seconds: float = DEDUP_WINDOW_SECONDS) -> None:
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        # ticket_id → (signature, identifiers, scope, created_at)
+        self._signatures: Dict[str, Tuple[array, FrozenSet[str], Optional[str], float]] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(LSH_BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def _band_keys(sig: array) -> List[bytes]:
+        raw = sig.tobytes()
+        width = LSH_ROWS * sig.itemsize
+        return [raw[b * width:(b + 1) * width] for b in range(LSH_BANDS)]
+
+    def add(
+        self,
+        ticket_id: str,
+        text: str,
+        created_at: Optional[float] = None,
+        sig: Optional[array] = None,
+        scope: Optional[str] = None,
+    ) -> None:
+        sig = sig if sig is not None else minhash(text)
+        if sig is None:
+            return
+        with self._lock:
+            if ticket_id in self._signatures:
+                return
+            self._signatures[ticket_id] = (sig, identifiers(text), scope, created_at or time.time())
+            for band, key in zip(self._buckets, self._band_keys(sig)):
+                band.setdefault(key, set()).add(ticket_id)
+
+    def remove(self, ticket_id: str) -> None:
+        with self._lock:
+            entry = self._signatures.pop(ticket_id, None)
+            if entry is None:
+                return
+            for band, key in zip(self._buckets, self._band_keys(entry[0])):
+                ids = band.get(key)
+                if ids is not None:
+                    ids.discard(ticket_id)
+                    if not ids:
+                        del band[key]
+
+    def find_duplicate(
+        self, text: str, sig: Optional[array] = None, scope: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """Best matching ticket (ticket_id, similarity) above threshold, or None"""
+        sig = sig if sig is not None else minhash(text)
+        if sig is None:
+            return None
+        ids = identifiers(text)
+        cutoff = time.time() - self.window_seconds
+        candidates: Counter = Counter()
+        with self._lock:
+            for band, key in zip(self._buckets, self._band_keys(sig)):
+                candidates.update(band.get(key, ()))
+            scored = []
+            expired = []
+            for ticket_id, _ in candidates.most_common(MAX_CANDIDATES):
+                other, other_ids, other_scope, created_at = self._signatures[ticket_id]
+                if created_at < cutoff:
+                    expired.append(ticket_id)
+                    continue
+                if other_scope != scope:
+                    continue  # another tenant's ticket
+                if other_ids != ids:
+                    continue  # same wording, different account/order: not a duplicate
+                scored.append((estimated_jaccard(sig, other), ticket_id))
+        # Expired tickets are dropped lazily, when a lookup runs into them
+        for ticket_id in expired:
+            self.remove(ticket_id)
+
+        if not scored:
+            return None
+        similarity, ticket_id = max(scored)
+        if similarity < self.threshold:
+            return None
+        return ticket_id, similarity
@@ -0,0 +1,506 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, List, Optional
+
+from tenants import DEFAULT_TENANT_ID
+from ticket_dedup import SIGNATURE_VERSION, TicketSimilarityIndex, minhash
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 2.0  # seconds, dispatcher is also woken up on every enqueue
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 2.0  # seconds, doubled on every failed attempt
+OUTBOX_BACKOFF_MAX = 300.0
+# A claimed batch is hidden from other workers' dispatchers for this long; if the claiming
+# worker dies mid-delivery the entries become due again (tracker calls must finish well within it)
+OUTBOX_LEASE_SECONDS = 60.0
+PRIORITY_ORDER = ["P0", "P1", "P2", "P3"]
+OPEN_STATUSES = ("queued", "delivered", "delivery_failed")
+# Columns returned by TicketStore.get (the minhash BLOB is internal and not JSON-serializable)
+TICKET_FIELDS = (
+    "ticket_id", "tenant_id", "idempotency_key", "title", "description", "priority", "thread_id", "status",
+    "external_id", "created_at", "updated_at", "duplicate_count",
+)
+
+
+def idempotency_key(title: str, description: str, priority: str, tenant_id: str = DEFAULT_TENANT_ID) -> str:
+    """Deterministic key for a ticket (same input → same key on every worker and restart).
+    Tenants get separate keys; the default tenant's keys are unchanged from before tenants"""
+    parts = [title, description, priority]
+    if tenant_id != DEFAULT_TENANT_ID:
+        parts.append(tenant_id)
+    normalized = [re.sub(r"\s+", " ", part.strip().lower()) for part in parts]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+def ticket_id_for_key(key: str) -> str:
+    # 10 hex chars = 40 bits, collisions are negligible at our volume
+    return f"TCK-{key[:10].upper()}"
+
+
+# ---------- storage ----------
+class TicketStore:
+    """SQLite-backed tickets with a transactional outbox for delivery to the tracker"""
+
+    def __init__(self, db_path: str, dedup: Optional[TicketSimilarityIndex] = None) -> None:
+        self.db_path = db_path
+        # Near-duplicate detection over recent open tickets (None = disabled)
+        self.dedup = dedup
+        # Highest tickets rowid loaded into the index; newer rows (e.g. written by other
+        # workers) are picked up before every duplicate lookup
+        self._dedup_rowid = 0
+        self._dedup_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init(self) -> None:
+        self.create_schema()
+        self.load()
+
+    def create_schema(self) -> None:
+        conn = self._connect()
+        # WAL lets the dispatcher read the outbox while request handlers write to it
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tickets (
+              ticket_id TEXT PRIMARY KEY,
+              tenant_id TEXT NOT NULL DEFAULT 'default',
+              idempotency_key TEXT UNIQUE NOT NULL,
+              title TEXT,
+              description TEXT,
+              priority TEXT,
+              thread_id TEXT,
+              status TEXT NOT NULL,
+              external_id TEXT,
+              created_at REAL,
+              updated_at REAL,
+              minhash BLOB,
+              minhash_version INTEGER,
+              duplicate_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS ticket_duplicates (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              ticket_id TEXT NOT NULL,
+              title TEXT,
+              description TEXT,
+              priority TEXT,
+              thread_id TEXT,
+              similarity REAL,
+              created_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS ticket_outbox (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              ticket_id TEXT NOT NULL,
+              attempts INTEGER NOT NULL DEFAULT 0,
+              next_attempt_at REAL NOT NULL,
+              delivered_at REAL,
+              last_error TEXT,
+              duplicate_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_pending
+              ON ticket_outbox (next_attempt_at) WHERE delivered_at IS NULL;
+            """
+        )
+        # Databases created before near-duplicate detection
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(tickets)")}
+        if "minhash" not in columns:
+            conn.execute("ALTER TABLE tickets ADD COLUMN minhash BLOB")
+        if "duplicate_count" not in columns:
+            conn.execute("ALTER TABLE tickets ADD COLUMN duplicate_count INTEGER NOT NULL DEFAULT 0")
+        if "minhash_version" not in columns:
+            conn.execute("ALTER TABLE tickets ADD COLUMN minhash_version INTEGER")
+        if "tenant_id" not in columns:
+            conn.execute(f"ALTER TABLE tickets ADD COLUMN tenant_id TEXT NOT NULL DEFAULT '{DEFAULT_TENANT_ID}'")
+        # Databases created before attached reports were forwarded to the tracker
+        outbox_columns = {row["name"] for row in conn.execute("PRAGMA table_info(ticket_outbox)")}
+        if "duplicate_id" not in outbox_columns:
+            conn.execute("ALTER TABLE ticket_outbox ADD COLUMN duplicate_id INTEGER")
+        conn.commit()
+        conn.close()
+
+    def load(self) -> None:
+        """In-memory state kept across requests (the near-duplicate index)"""
+        if self.dedup is not None:
+            self.rebuild_dedup_index()
+
+    def rebuild_dedup_index(self) -> int:
+        """Loads signatures of recent open tickets into the similarity index"""
+        conn = self._connect()
+        try:
+            return self._refresh_dedup_index(conn)
+        finally:
+            conn.close()
+
+    def _refresh_dedup_index(self, conn: sqlite3.Connection) -> int:
+        """Adds open tickets stored since the last refresh (by this or another worker) to the index"""
+        cutoff = time.time() - self.dedup.window_seconds
+        with self._dedup_lock:
+            rows = conn.execute(
+                f"""
+                SELECT rowid, ticket_id, tenant_id, title, description, created_at, minhash, minhash_version
+                FROM tickets
+                WHERE rowid > ? AND created_at >= ? AND status IN ({",".join("?" * len(OPEN_STATUSES))})
+                ORDER BY rowid
+                """,
+                (self._dedup_rowid, cutoff, *OPEN_STATUSES),
+            ).fetchall()
+            for row in rows:
+                sig = None
+                # Signatures from an older shingling scheme are recomputed from the text
+                if row["minhash"] and row["minhash_version"] == SIGNATURE_VERSION:
+                    sig = array("I")
+                    sig.frombytes(row["minhash"])
+                text = f"{row['title']}\n{row['description']}"
+                self.dedup.add(row["ticket_id"], text, row["created_at"], sig=sig, scope=row["tenant_id"])
+                self._dedup_rowid = max(self._dedup_rowid, row["rowid"])
+        return len(rows)
+
+    def enqueue(
+        self,
+        title: str,
+        description: str,
+        priority: str = "P2",
+        thread_id: Optional[str] = None,
+        tenant_id: str = DEFAULT_TENANT_ID,
+    ) -> Dict[str, Any]:
+        """Stores the ticket and its outbox entry in one transaction; repeats return the existing ticket.
+        Idempotency and near-duplicate matching are per tenant"""
+        key = idempotency_key(title, description, priority, tenant_id)
+        ticket_id = ticket_id_for_key(key)
+        now = time.time()
+
+        text = f"{title}\n{description}"
+        sig = minhash(text) if self.dedup is not None else None
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute("SELECT * FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            duplicate_of = None
+            if existing is None and sig is not None:
+                # Under the write lock, so a near-duplicate stored a moment ago by another
+                # worker is already in the index
+                self._refresh_dedup_index(conn)
+                duplicate_of = self.dedup.find_duplicate(text, sig=sig, scope=tenant_id)
+            if duplicate_of is not None:
+                attached = self._attach_duplicate(conn, duplicate_of, title, description, priority, thread_id, now)
+                if attached is not None:
+                    conn.commit()
+                    return attached
+
+            created = existing is None
+            if created:
+                conn.execute(
+                    """
+                    INSERT INTO tickets
+                      (ticket_id, tenant_id, idempotency_key, title, description, priority, thread_id, status,
+                       created_at, updated_at, minhash, minhash_version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+                    """,
+                    (ticket_id, tenant_id, key, title, description, priority, thread_id, now, now,
+                     sig.tobytes() if sig is not None else None, SIGNATURE_VERSION),
+                )
+                conn.execute(
+                    "INSERT INTO ticket_outbox (ticket_id, next_attempt_at) VALUES (?, ?)",
+                    (ticket_id, now),
+                )
+            row = conn.execute("SELECT * FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if created and sig is not None:
+            self.dedup.add(ticket_id, text, now, sig=sig, scope=tenant_id)
+
+        return {
+            "ticket_id": row["ticket_id"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "created": created,
+        }
+
+    def _attach_duplicate(
+        self,
+        conn: sqlite3.Connection,
+        match: tuple,
+        title: str,
+        description: str,
+        priority: str,
+        thread_id: Optional[str],
+        now: float,
+    ) -> Optional[Dict[str, Any]]:
+        """Records the new report on an open ticket instead of creating a new one, and queues
+        it for the tracker as a linked report so the reporter isn't lost"""
+        target_id, similarity = match
+        target = conn.execute("SELECT * FROM tickets WHERE ticket_id = ?", (target_id,)).fetchone()
+        if target is None or target["status"] not in OPEN_STATUSES:
+            # Index is stale (ticket closed by another worker) - fall back to a new ticket
+            if self.dedup is not None:
+                self.dedup.remove(target_id)
+            return None
+
+        duplicate_id = conn.execute(
+            """
+            INSERT INTO ticket_duplicates (ticket_id, title, description, priority, thread_id, similarity, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (target_id, title, description, priority, thread_id, similarity, now),
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO ticket_outbox (ticket_id, next_attempt_at, duplicate_id) VALUES (?, ?, ?)",
+            (target_id, now, duplicate_id),
+        )
+        # Repeated reports may escalate the open ticket (e.g. repeated payment failures → P1)
+        new_priority = target["priority"]
+        if priority in PRIORITY_ORDER and (
+            new_priority not in PRIORITY_ORDER or PRIORITY_ORDER.index(priority) < PRIORITY_ORDER.index(new_priority)
+        ):
+            new_priority = priority
+        conn.execute(
+            "UPDATE tickets SET duplicate_count = duplicate_count + 1, priority = ?, updated_at = ? WHERE ticket_id = ?",
+            (new_priority, now, target_id),
+        )
+        return {
+            "ticket_id": target_id,
+            "status": target["status"],
+            "priority": new_priority,
+            "created": False,
+            "attached": True,
+            "similarity": similarity,
+        }
+
+    def close(self, ticket_id: str) -> None:
+        """Closes a ticket; closed tickets no longer absorb new duplicates"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE tickets SET status = 'closed', updated_at = ? WHERE ticket_id = ?",
+                (time.time(), ticket_id),
+            )
+        conn.close()
+        if self.dedup is not None:
+            self.dedup.remove(ticket_id)
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT {', '.join(TICKET_FIELDS)} FROM tickets WHERE ticket_id = ?", (ticket_id,)
+        ).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def claim_batch(self, limit: int = OUTBOX_BATCH_SIZE, lease: float = OUTBOX_LEASE_SECONDS) -> List[Dict[str, Any]]:
+        """Claims outbox entries ready for (re)delivery, joined with their tickets (and, for
+        attached reports, the report). A report waits until its ticket has been delivered.
+
+        Selecting and leasing happen in one write transaction (next_attempt_at is pushed
+        forward by the lease), so with several workers each entry is claimed by one of them."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                """
+                SELECT o.id AS outbox_id, o.attempts, o.duplicate_id, t.ticket_id, t.tenant_id, t.external_id,
+                       t.title, t.description, t.priority, t.thread_id, t.created_at,
+                       d.title AS report_title, d.description AS report_description,
+                       d.priority AS report_priority, d.thread_id AS report_thread_id,
+                       d.created_at AS report_created_at
+                FROM ticket_outbox o JOIN tickets t ON t.ticket_id = o.ticket_id
+                LEFT JOIN ticket_duplicates d ON d.id = o.duplicate_id
+                WHERE o.delivered_at IS NULL AND o.next_attempt_at <= ?
+                  AND (o.duplicate_id IS NULL OR t.status != 'queued')
+                ORDER BY o.next_attempt_at
+                LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE ticket_outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + lease, row["outbox_id"]) for row in rows],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return [dict(r) for r in rows]
+
+    def mark_delivered(self, delivered: Dict[int, Optional[str]], ticket_ids: Dict[int, str]) -> None:
+        """delivered: outbox_id → external id returned by the tracker; ticket_ids: outbox_id →
+        ticket_id for entries that created a ticket (attached reports leave the ticket as is)"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            for outbox_id, external_id in delivered.items():
+                conn.execute("UPDATE ticket_outbox SET delivered_at = ? WHERE id = ?", (now, outbox_id))
+                if outbox_id not in ticket_ids:
+                    continue
+                conn.execute(
+                    "UPDATE tickets SET status = 'delivered', external_id = ?, updated_at = ? WHERE ticket_id = ?",
+                    (external_id, now, ticket_ids[outbox_id]),
+                )
+        conn.close()
+
+    def mark_failed(self, entries: List[Dict[str, Any]], error: str) -> None:
+        """Schedules a retry with exponential backoff + jitter; gives up after OUTBOX_MAX_ATTEMPTS"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            for entry in entries:
+                attempts = entry["attempts"] + 1
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    # Dead letter: stays in the outbox for inspection, never retried
+                    conn.execute(
+                        "UPDATE ticket_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                        (attempts, error, float("inf"), entry["outbox_id"]),
+                    )
+                    if entry["duplicate_id"] is not None:
+                        continue  # a failed report doesn't fail the ticket it was attached to
+                    conn.execute(
+                        "UPDATE tickets SET status = 'delivery_failed', updated_at = ? WHERE ticket_id = ?",
+                        (now, entry["ticket_id"]),
+                    )
+                    continue
+                delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+                delay *= random.uniform(0.5, 1.0)  # jitter, so failed batches don't retry in lockstep
+                conn.execute(
+                    "UPDATE ticket_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (attempts, error, now + delay, entry["outbox_id"]),
+                )
+        conn.close()
+
+
+# ---------- tracker adapters ----------
+class TrackerAdapter(ABC):
+    """Delivers a batch of tickets to an external tracker (Jira/Linear/Zendesk...)"""
+
+    @abstractmethod
+    def deliver(self, tickets: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Returns ticket_id → external id for new tickets; raises if the batch could not be delivered.
+
+        Items with a duplicate_report_id are further reports of an already delivered ticket
+        (ticket_id, external_id), to be added to it as a comment or linked report."""
+
+
+class LocalTrackerAdapter(TrackerAdapter):
+    """Stand-in tracker: keeps delivered tickets in memory and optionally appends them to a JSONL file"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.delivered: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def deliver(self, tickets: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        with self._lock:
+            self.delivered.extend(tickets)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for t in tickets:
+                        f.write(json.dumps(t, ensure_ascii=False) + "\n")
+        return {t["ticket_id"]: f"LOCAL-{t['ticket_id']}" for t in tickets}
+
+
+def make_tracker_adapter() -> TrackerAdapter:
+    """Adapter selected by TICKET_TRACKER env var (only 'local' is available for now)"""
+    kind = os.getenv("TICKET_TRACKER", "local")
+    if kind == "local":
+        return LocalTrackerAdapter(os.getenv("TICKET_TRACKER_PATH"))
+    raise ValueError(f"Unknown ticket tracker: {kind}")
+
+
+# ---------- dispatcher ----------
+class OutboxDispatcher:
+    """Background thread that delivers outbox entries to the tracker in batches"""
+
+    def __init__(
+        self,
+        store: TicketStore,
+        adapter: TrackerAdapter,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ) -> None:
+        self.store = store
+        self.adapter = adapter
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ticket-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self) -> None:
+        """Called after enqueue, so new tickets don't wait for the next poll"""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delivered = self.dispatch_once()
+            except Exception as e:
+                print(f"⚠️  Ticket outbox dispatcher error: {e}")
+                delivered = 0
+            # A full batch means there is probably more waiting
+            if delivered < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    @staticmethod
+    def _tracker_item(entry: Dict[str, Any]) -> Dict[str, Any]:
+        fields = ("title", "description", "priority", "thread_id", "created_at")
+        if entry["duplicate_id"] is None:
+            return {"ticket_id": entry["ticket_id"], "tenant_id": entry["tenant_id"], **{k: entry[k] for k in fields}}
+        return {
+            "ticket_id": entry["ticket_id"],
+            "tenant_id": entry["tenant_id"],
+            "external_id": entry["external_id"],
+            "duplicate_report_id": entry["duplicate_id"],
+            **{k: entry[f"report_{k}"] for k in fields},
+        }
+
+    def dispatch_once(self) -> int:
+        """Delivers one claimed batch; returns number of entries processed"""
+        batch = self.store.claim_batch(self.batch_size)
+        if not batch:
+            return 0
+        tickets = [self._tracker_item(e) for e in batch]
+        try:
+            external_ids = self.adapter.deliver(tickets)
+        except Exception as e:
+            print(f"⚠️  Ticket delivery failed for {len(batch)} tickets: {e}")
+            self.store.mark_failed(batch, f"{type(e).__name__}: {e}")
+            return len(batch)
+
+        self.store.mark_delivered(
+            {e["outbox_id"]: external_ids.get(e["ticket_id"]) for e in batch},
+            {e["outbox_id"]: e["ticket_id"] for e in batch if e["duplicate_id"] is None},
+        )
+        print(f"📮 Delivered {len(batch)} tickets to tracker")
+        return len(batch)
@@ -0,0 +1,183 @@
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TOOL_TIMEOUT = 10.0  # seconds
+MAX_TOOL_WORKERS = 8
+QUEUED_POLL_INTERVAL = 0.05  # seconds, how soon a queued call's timeout starts counting
+# Timed-out calls keep their pool thread until they return; if hung tools hold every thread,
+# queued calls give up after this long (from submission) instead of waiting forever
+TOOL_QUEUE_TIMEOUT = 10.0
+
+
+@dataclass
+class Tool:
+    name: str
+    fn: Callable[..., Any]
+    schema: Optional[Dict[str, Any]] = None  # OpenAI function schema; None = backend-only tool
+    timeout: float = DEFAULT_TOOL_TIMEOUT
+
+
+class ToolRegistry:
+    """Name → tool mapping; replaces hand-written `if name == ...` dispatch"""
+
+    def __init__(self) -> None:
+        self._tools: Dict[str, Tool] = {}
+
+    def register(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        schema: Optional[Dict[str, Any]] = None,
+        timeout: float = DEFAULT_TOOL_TIMEOUT,
+    ) -> None:
+        self._tools[name] = Tool(name=name, fn=fn, schema=schema, timeout=timeout)
+
+    def get(self, name: str) -> Tool:
+        if name not in self._tools:
+            raise ValueError(f"Unknown tool: {name}")
+        return self._tools[name]
+
+    def dispatch(self, name: str, args: Dict[str, Any]) -> Any:
+        return self.get(name).fn(**args)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """Tool definitions exposed to the model"""
+        return [
+            {"type": "function", "function": {"name": t.name, **t.schema}}
+            for t in self._tools.values()
+            if t.schema is not None
+        ]
+
+
+@dataclass
+class ToolCall:
+    call_id: str
+    name: str
+    arguments: str  # raw JSON string as returned by the model
+
+
+@dataclass
+class ToolOutcome:
+    call: ToolCall
+    args: Dict[str, Any]
+    result: Any
+    ok: bool
+    duration_ms: float
+
+
+def tool_error(kind: str, message: str) -> Dict[str, Any]:
+    """Structured error result, returned to the model instead of raising"""
+    return {"error": {"type": kind, "message": message}}
+
+
+class ToolExecutor:
+    """Runs tool calls of one model turn concurrently, each with its own timeout.
+
+    A call's timeout starts when a pool thread starts running it, so waiting for a free
+    thread in a busy pool is not counted against the tool. Waiting itself is capped by
+    queue_timeout, counted from submission; both are reported as a timeout error."""
+
+    def __init__(
+        self,
+        registry: ToolRegistry,
+        max_workers: int = MAX_TOOL_WORKERS,
+        queue_timeout: float = TOOL_QUEUE_TIMEOUT,
+    ) -> None:
+        self.registry = registry
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def run(self, calls: List[ToolCall], context: Optional[Dict[str, Any]] = None) -> List[ToolOutcome]:
+        """Executes calls and returns outcomes in the same order as calls.
+
+        context: backend-supplied arguments (e.g. tenant_id), passed to the tools whose function
+        accepts them; they override whatever the model sent under the same name"""
+        outcomes: List[Optional[ToolOutcome]] = [None] * len(calls)
+        pending = {}
+        submitted: Dict[int, float] = {}
+        started: Dict[int, float] = {}  # set by the pool thread when the call starts running
+
+        for i, call in enumerate(calls):
+            try:
+                args = json.loads(call.arguments or "{}")
+                if not isinstance(args, dict):
+                    raise ValueError("Tool arguments must be a JSON object")
+                tool = self.registry.get(call.name)
+            except ValueError as e:
+                # json.JSONDecodeError is a ValueError too
+                outcomes[i] = ToolOutcome(call, {}, tool_error("invalid_call", str(e)), False, 0.0)
+                continue
+            if context:
+                params = inspect.signature(tool.fn).parameters
+                args = {**args, **{k: v for k, v in context.items() if k in params}}
+            try:
+                # Wrong/missing arguments from the model; checked here so a TypeError raised
+                # inside the tool is reported as a tool failure, not as bad arguments
+                inspect.signature(tool.fn).bind(**args)
+            except TypeError as e:
+                outcomes[i] = ToolOutcome(call, args, tool_error("invalid_arguments", str(e)), False, 0.0)
+                continue
+            submitted[i] = time.perf_counter()
+            future = self._pool.submit(self._call, started, i, tool.fn, args)
+            pending[future] = (i, args, tool)
+
+        # Wake up on every completion, on the nearest per-call deadline, and while some
+        # calls are still queued, often enough to start their clocks on time
+        while pending:
+            now = time.perf_counter()
+            for future in list(pending):
+                i, args, tool = pending[future]
+                if future.done():
+                    continue
+                if i in started and now - started[i] >= tool.timeout:
+                    pending.pop(future)
+                    outcomes[i] = self._timed_out(calls[i], args, future, tool, now - started[i])
+                elif i not in started and now - submitted[i] >= self.queue_timeout and future.cancel():
+                    pending.pop(future)
+                    message = f"{tool.name} did not start within {self.queue_timeout:.1f}s, all tool workers are busy"
+                    outcomes[i] = ToolOutcome(calls[i], args, tool_error("timeout", message), False, 0.0)
+            if not pending:
+                break
+            deadlines = [
+                started[i] + tool.timeout if i in started else submitted[i] + self.queue_timeout
+                for i, _, tool in pending.values()
+            ]
+            timeout = max(min(deadlines) - now, 0)
+            if any(i not in started for i, _, _ in pending.values()):
+                timeout = min(timeout, QUEUED_POLL_INTERVAL)
+            done, _ = wait(list(pending), timeout=timeout, return_when="FIRST_COMPLETED")
+            now = time.perf_counter()
+            for future in done:
+                i, args, tool = pending.pop(future)
+                outcomes[i] = self._collect(calls[i], args, future, (now - started.get(i, now)) * 1000)
+
+        return [o for o in outcomes if o is not None]
+
+    @staticmethod
+    def _call(started: Dict[int, float], i: int, fn: Callable[..., Any], args: Dict[str, Any]) -> Any:
+        started[i] = time.perf_counter()
+        return fn(**args)
+
+    def _collect(self, call: ToolCall, args: Dict[str, Any], future: Any, duration_ms: float) -> ToolOutcome:
+        try:
+            return ToolOutcome(call, args, future.result(), True, duration_ms)
+        except Exception as e:
+            return ToolOutcome(
+                call, args, tool_error("tool_failed", f"{type(e).__name__}: {e}"), False, duration_ms
+            )
+
+    def _timed_out(self, call: ToolCall, args: Dict[str, Any], future: Any, tool: Tool, elapsed: float) -> ToolOutcome:
+        # cancel() only stops calls that haven't started; a running call finishes in the
+        # background and its result is dropped
+        future.cancel()
+        return ToolOutcome(
+            call,
+            args,
+            tool_error("timeout", f"{tool.name} did not finish within {tool.timeout:.1f}s"),
+            False,
+            elapsed * 1000,
+        )
@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 """
 Скрипт для просмотра истории диалогов из runs.db
+
+Экспорт (потоково, в постоянной памяти):
+    python view_history.py export --format=csv --gzip --output=runs.csv.gz
+    python view_history.py export --since=2024-05-01 --until=2024-06-01 > may.ndjson
+    python view_history.py export --from-id=1000 --to-id=2000 --thread=demo-thread
 """
+import csv
+import gzip
+import io
 import sqlite3
 import json
+import sys
+import time
 from datetime import datetime
 
 DB_PATH = "runs.db"
+EXPORT_CHUNK_SIZE = 5000  # строк за один fetchmany
+EXPORT_COLUMNS = ["id", "thread_id", "user_message", "tool_name", "tool_args", "tool_result", "final_answer", "created_at"]
 
 def view_history(limit=10, thread_id=None):
     """Просмотр истории диалогов"""
@@ -81,11 +93,137 @@ def view_threads():
     
     conn.close()
 
+def parse_time(value):
+    """Время для фильтра: unix timestamp или ISO дата/время (2024-05-01, 2024-05-01T12:00)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def parse_export_args(args):
+    """Разбор аргументов export: --format=ndjson|csv --gzip --output=... --since/--until --from-id/--to-id --thread"""
+    options = {"format": "ndjson", "gzip": False, "output": None, "since": None, "until": None,
+               "from_id": None, "to_id": None, "thread_id": None}
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name == "--format" and value in ("ndjson", "csv"):
+            options["format"] = value
+        elif name == "--gzip":
+            options["gzip"] = True
+        elif name == "--output":
+            options["output"] = value
+        elif name in ("--since", "--until"):
+            options[name[2:]] = parse_time(value)
+        elif name in ("--from-id", "--to-id"):
+            options[name[2:].replace("-", "_")] = int(value)
+        elif name == "--thread":
+            options["thread_id"] = value
+        else:
+            raise SystemExit(f"Неизвестный аргумент export: {arg}")
+    # runs.csv.gz → сжимаем, даже если --gzip не указан
+    if options["output"] and options["output"].endswith(".gz"):
+        options["gzip"] = True
+    return options
+
+def open_export_output(path, compress):
+    """Текстовый поток для записи: файл или stdout, при необходимости через gzip"""
+    if compress:
+        # mtime=0: одинаковые данные дают одинаковый архив
+        if path:
+            raw = gzip.GzipFile(path, mode="wb", compresslevel=6, mtime=0)
+        else:
+            raw = gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb", compresslevel=6, mtime=0)
+    else:
+        raw = open(path, "wb") if path else sys.stdout.buffer
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+def export_runs(options):
+    """Потоковый экспорт runs в NDJSON или CSV: курсор читается порциями, память не растёт"""
+    # Только чтение: экспорт не мешает серверу писать в базу
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    cur = conn.cursor()
+
+    # В старых базах нет created_at
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(runs)")}
+    select = ", ".join(c if c in columns else f"NULL AS {c}" for c in EXPORT_COLUMNS)
+
+    where, params = [], []
+    if options["from_id"] is not None:
+        where.append("id >= ?")
+        params.append(options["from_id"])
+    if options["to_id"] is not None:
+        where.append("id <= ?")
+        params.append(options["to_id"])
+    # Записи без created_at (до его появления) под фильтр по времени не попадают
+    if options["since"] is not None:
+        where.append("created_at >= ?")
+        params.append(options["since"])
+    if options["until"] is not None:
+        where.append("created_at < ?")
+        params.append(options["until"])
+    if options["thread_id"]:
+        where.append("thread_id = ?")
+        params.append(options["thread_id"])
+    query = f"SELECT {select} FROM runs"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY id"
+
+    started = time.perf_counter()
+    out = open_export_output(options["output"], options["gzip"])
+    count = 0
+    try:
+        cur.execute(query, params)
+        if options["format"] == "csv":
+            writer = csv.writer(out)
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            if options["format"] == "csv":
+                # tool_args / tool_result остаются JSON-строками в ячейках
+                writer.writerows(rows)
+            else:
+                out.write("".join(ndjson_line(row) for row in rows))
+            count += len(rows)
+    finally:
+        if options["output"] or options["gzip"]:
+            out.close()
+        else:
+            out.flush()
+            out.detach()  # sys.stdout остаётся открытым
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Экспортировано {count} записей за {elapsed:.1f} с", file=sys.stderr)
+
+_json_string = json.JSONEncoder(ensure_ascii=False).encode
+
+def embedded_json(text):
+    """tool_args / tool_result уже сохранены как JSON (json.dumps в log_run) — вкладываем текст как есть,
+    без разбора и повторной сериализации; явно не-JSON текст экспортируется строкой"""
+    if not text:
+        return "null"
+    if text[0] in '{["-0123456789' or text in ("true", "false", "null"):
+        return text
+    return _json_string(text)
+
+def ndjson_line(row):
+    """Строка runs → одна строка NDJSON"""
+    run_id, thread_id, user_message, tool_name, tool_args, tool_result, final_answer, created_at = row
+    return (
+        f'{{"id": {run_id}, "thread_id": {_json_string(thread_id)}, '
+        f'"user_message": {_json_string(user_message)}, "tool_name": {_json_string(tool_name)}, '
+        f'"tool_args": {embedded_json(tool_args)}, "tool_result": {embedded_json(tool_result)}, '
+        f'"final_answer": {_json_string(final_answer)}, "created_at": {_json_string(created_at)}}}\n'
+    )
+
 if __name__ == "__main__":
-    import sys
-    
     if len(sys.argv) > 1:
-        if sys.argv[1] == "--threads":
+        if sys.argv[1] == "export":
+            export_runs(parse_export_args(sys.argv[2:]))
+        elif sys.argv[1] == "--threads":
             view_threads()
         elif sys.argv[1].startswith("--thread="):
             thread_id = sys.argv[1].split("=")[1]